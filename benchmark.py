@@ -0,0 +1,244 @@
+"""Times each stage of the emojicompat pipeline.
+
+Runs against synthetic fonts of several sizes, built from the real compat
+metadata with a GSUB padded out by contextual lookups, and against the
+noto_emji_2_028.dat sample in tests/testdata.
+
+    python benchmark.py --sizes 256,1024,4000 --repeat 5
+"""
+
+from absl import app
+from absl import flags
+from emojicompat.compat_metadata import (
+    CompatEntry,
+    emoji_compat_metadata,
+    emoji_compat_metadata_columns,
+    emoji_metadata_file,
+    emoji_metadata_sidecar_file,
+    load_emoji_metadata,
+)
+from emojicompat.emojicompat import (
+    _hash_of_font_without_compat_data,
+    _hash_of_tables_without_compat_data,
+    _setup_meta,
+    _setup_pua,
+)
+from emojicompat.flatbuffer import FlatbufferList, FlatbufferListView
+from fontTools import ttLib
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+import io
+import json
+from pathlib import Path
+import statistics
+import time
+from typing import Callable, List, Sequence, Tuple
+
+
+FLAGS = flags.FLAGS
+
+
+flags.DEFINE_list("sizes", ["256", "1024", "4000"], "Emoji per synthetic font.")
+flags.DEFINE_integer("context_lookups", 64, "Contextual lookups padding out GSUB.")
+flags.DEFINE_integer("repeat", 5, "Times to run each stage.")
+flags.DEFINE_string("output", None, "Also write results here, as JSON lines.")
+
+
+_SAMPLE = Path(__file__).parent / "tests" / "testdata" / "noto_emji_2_028.dat"
+
+
+def _glyph_name(codepoints: Sequence[int]) -> str:
+    return "u" + "_".join(f"{c:04X}" for c in codepoints)
+
+
+def _synthetic_font(entries: Sequence[CompatEntry], context_lookups: int) -> bytes:
+    codepoints = sorted({c for e in entries for c in e.codepoints})
+    sequences = [e.codepoints for e in entries if len(e.codepoints) > 1]
+    glyphs = (
+        [".notdef"]
+        + [_glyph_name((c,)) for c in codepoints]
+        + [_glyph_name(s) for s in sequences]
+    )
+
+    fb = FontBuilder(1024, isTTF=True)
+    fb.setupGlyphOrder(glyphs)
+    cmap = {c: _glyph_name((c,)) for c in codepoints}
+    fb.setupCharacterMap(cmap)
+    empty = TTGlyphPen(None).glyph()
+    fb.setupGlyf({g: empty for g in glyphs})
+    fb.setupHorizontalMetrics({g: (1275, 0) for g in glyphs})
+    fb.setupHorizontalHeader()
+    fb.setupOS2()
+    fb.setupPost()
+    fb.setupNameTable({"familyName": "Benchmark Emoji", "styleName": "Regular"})
+
+    # Contextual lookups emojicompat has no interest in but must walk past
+    singles = [_glyph_name((c,)) for c in codepoints[:32]]
+    fea = []
+    for i in range(context_lookups):
+        a, b = singles[i % len(singles)], singles[(i + 1) % len(singles)]
+        fea.append(f"lookup single{i} {{ sub {a} by {b}; }} single{i};")
+    fea.append("feature ccmp {")
+    for i in range(context_lookups):
+        a, b = singles[i % len(singles)], singles[(i + 3) % len(singles)]
+        fea.append(f"  sub {a}' lookup single{i} {b};")
+    fea.append("} ccmp;")
+    fea.append("feature liga {")
+    for seq in sequences:
+        fea.append(
+            f"  sub {' '.join(_glyph_name((c,)) for c in seq)} by {_glyph_name(seq)};"
+        )
+    fea.append("} liga;")
+    addOpenTypeFeaturesFromString(fb.font, "\n".join(fea))
+
+    flat_list = FlatbufferList.from_compat_entries(tuple(entries), "benchmark")
+    _setup_meta(fb.font, flat_list)
+
+    buf = io.BytesIO()
+    fb.font.save(buf)
+    return buf.getvalue()
+
+
+def _time(fn: Callable[[], object], setup: Callable[[], tuple]) -> List[float]:
+    timings = []
+    for _ in range(FLAGS.repeat):
+        args = setup()
+        start = time.perf_counter()
+        fn(*args)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def _version_and_sha(font: ttLib.TTFont) -> tuple:
+    flat_list = FlatbufferListView.fromfont(font)
+    return flat_list.version, flat_list.source_sha
+
+
+def _font_stages(font_data: bytes) -> List[Tuple[str, Callable, Callable]]:
+    entries = emoji_compat_metadata()
+    columns = emoji_compat_metadata_columns()
+
+    def load():
+        return (ttLib.TTFont(io.BytesIO(font_data)),)
+
+    def load_and_list():
+        font = ttLib.TTFont(io.BytesIO(font_data))
+        return font, FlatbufferList.fromfont(font)
+
+    def set_up():
+        font, flat_list = load_and_list()
+        _setup_meta(font, flat_list)
+        _setup_pua(font, flat_list)
+        return (font,)
+
+    return [
+        ("ttLib.TTFont", lambda: ttLib.TTFont(io.BytesIO(font_data)), tuple),
+        ("FlatbufferList.fromfont", FlatbufferList.fromfont, load),
+        ("FlatbufferListView.fromfont version+sha", _version_and_sha, load),
+        (
+            "from_compat_entries",
+            lambda: FlatbufferList.from_compat_entries(entries, ""),
+            tuple,
+        ),
+        (
+            "from_compat_columns",
+            lambda: FlatbufferList.from_compat_columns(columns, ""),
+            tuple,
+        ),
+        ("_hash_of_font_without_compat_data", _hash_of_font_without_compat_data, load),
+        (
+            "_hash_of_tables_without_compat_data",
+            _hash_of_tables_without_compat_data,
+            load,
+        ),
+        ("_setup_pua", _setup_pua, load_and_list),
+        ("font.save", lambda font: font.save(io.BytesIO()), set_up),
+    ]
+
+
+def _flat_stages(flat: bytes) -> List[Tuple[str, Callable, Callable]]:
+    flat_list = FlatbufferList.fromflatbytes(flat)
+    return [
+        ("fromflatbytes", lambda: FlatbufferList.fromflatbytes(flat), tuple),
+        (
+            "fromflatbytes bulk",
+            lambda: FlatbufferList.fromflatbytes(flat, bulk=True),
+            tuple,
+        ),
+        (
+            "fromflatbytes columnar",
+            lambda: FlatbufferList.fromflatbytes(flat, columnar=True),
+            tuple,
+        ),
+        (
+            "FlatbufferListView all items",
+            lambda: tuple(FlatbufferListView.fromflatbytes(flat).items),
+            tuple,
+        ),
+        ("toflatbytes", flat_list.toflatbytes, tuple),
+        (
+            "toflatbytes builder",
+            lambda: flat_list.toflatbytes(use_builder=True),
+            tuple,
+        ),
+    ]
+
+
+def _metadata_stages() -> List[Tuple[str, Callable, Callable]]:
+    return [
+        (
+            "parse emoji_metadata.txt",
+            lambda: load_emoji_metadata(emoji_metadata_file()),
+            tuple,
+        ),
+        (
+            "load emoji_metadata.bin",
+            lambda: load_emoji_metadata(
+                emoji_metadata_file(), emoji_metadata_sidecar_file()
+            ),
+            tuple,
+        ),
+    ]
+
+
+def main(_):
+    results = []
+
+    def run(subject: str, stages: List[Tuple[str, Callable, Callable]]):
+        for stage, fn, setup in stages:
+            timings = _time(fn, setup)
+            result = {
+                "subject": subject,
+                "stage": stage,
+                "min_ms": 1000 * min(timings),
+                "median_ms": 1000 * statistics.median(timings),
+            }
+            results.append(result)
+            print(
+                f"{subject:>24} {stage:42} "
+                f"{result['min_ms']:10.2f} {result['median_ms']:10.2f}"
+            )
+
+    print(f"{'subject':>24} {'stage':42} {'min ms':>10} {'median ms':>10}")
+    run("emoji_metadata", _metadata_stages())
+    run(_SAMPLE.name, _flat_stages(_SAMPLE.read_bytes()))
+
+    entries = emoji_compat_metadata()
+    for size in (int(s) for s in FLAGS.sizes):
+        font_data = _synthetic_font(entries[:size], FLAGS.context_lookups)
+        subject = f"synthetic {min(size, len(entries))} emoji"
+        run(subject, _font_stages(font_data))
+        run(
+            subject,
+            _flat_stages(ttLib.TTFont(io.BytesIO(font_data))["meta"].data["Emji"]),
+        )
+
+    if FLAGS.output:
+        with open(FLAGS.output, "w") as f:
+            for result in results:
+                f.write(json.dumps(result) + "\n")
+
+
+if __name__ == "__main__":
+    app.run(main)
@@ -0,0 +1,221 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""The real size of each color bitmap, read without decoding CBDT.
+
+Only the CBLC index and the two bytes of metrics at the start of each
+glyph's CBDT record are read, straight from the font file, so the cost
+doesn't depend on how big the PNGs are.
+
+https://docs.microsoft.com/en-us/typography/opentype/spec/cblc
+https://docs.microsoft.com/en-us/typography/opentype/spec/cbdt
+"""
+
+import contextlib
+from emojicompat.util import ligature_index
+from fontTools import ttLib
+from fontTools.misc.textTools import Tag
+import io
+import mmap
+import struct
+from typing import (
+    Container,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+
+# what struct.unpack_from reads from
+_Buffer = Union[bytes, bytearray, memoryview]
+
+_CBLC_HEADER = struct.Struct(">HHI")
+# indexSubTableArrayOffset, numberOfIndexSubTables, skipping the line metrics,
+# startGlyphIndex, endGlyphIndex, ppemX, ppemY
+_BITMAP_SIZE = struct.Struct(">I4xI4x24xHHBB2x")
+# firstGlyphIndex, lastGlyphIndex, additionalOffsetToIndexSubtable
+_INDEX_SUBTABLE_ARRAY_ENTRY = struct.Struct(">HHI")
+# indexFormat, imageFormat, imageDataOffset
+_INDEX_SUBHEADER = struct.Struct(">HHI")
+# imageSize, then the height and width that start bigGlyphMetrics
+_INDEX_CONSTANT_METRICS = struct.Struct(">IBB")
+# height and width start both smallGlyphMetrics and bigGlyphMetrics
+_GLYPH_SIZE = struct.Struct(">BB")
+
+
+class StrikeMetrics(NamedTuple):
+    ppem_x: int
+    ppem_y: int
+    width: int
+    height: int
+
+
+class _Glyph(NamedTuple):
+    glyph_id: int
+    # into CBDT, where its metrics start unless size is set
+    offset: int
+    # (width, height) when the index holds the metrics
+    size: Optional[Tuple[int, int]]
+
+
+def _offset_array(
+    cblc: _Buffer,
+    offset: int,
+    first: int,
+    last: int,
+    image_data_offset: int,
+    typecode: str,
+) -> Iterator[_Glyph]:
+    # formats 1 and 3, an offset per glyph plus one; equal offsets, no glyph
+    offsets = struct.unpack_from(f">{last - first + 2}{typecode}", cblc, offset)
+    for i in range(last - first + 1):
+        if offsets[i + 1] > offsets[i]:
+            yield _Glyph(first + i, image_data_offset + offsets[i], None)
+
+
+def _index_glyphs(
+    cblc: _Buffer, offset: int, first: int, last: int
+) -> Iterator[_Glyph]:
+    index_format, _, image_data_offset = _INDEX_SUBHEADER.unpack_from(cblc, offset)
+    offset += _INDEX_SUBHEADER.size
+    if index_format == 1:
+        yield from _offset_array(cblc, offset, first, last, image_data_offset, "I")
+    elif index_format == 3:
+        yield from _offset_array(cblc, offset, first, last, image_data_offset, "H")
+    elif index_format == 2:
+        image_size, height, width = _INDEX_CONSTANT_METRICS.unpack_from(cblc, offset)
+        for i in range(last - first + 1):
+            yield _Glyph(first + i, image_data_offset + i * image_size, (width, height))
+    elif index_format == 4:
+        (num_glyphs,) = struct.unpack_from(">I", cblc, offset)
+        pairs = struct.unpack_from(f">{2 * (num_glyphs + 1)}H", cblc, offset + 4)
+        for i in range(num_glyphs):
+            glyph_id, start, end = pairs[2 * i], pairs[2 * i + 1], pairs[2 * i + 3]
+            if end > start:
+                yield _Glyph(glyph_id, image_data_offset + start, None)
+    elif index_format == 5:
+        image_size, height, width = _INDEX_CONSTANT_METRICS.unpack_from(cblc, offset)
+        # past imageSize and the 8 byte bigGlyphMetrics
+        (num_glyphs,) = struct.unpack_from(">I", cblc, offset + 12)
+        glyph_ids = struct.unpack_from(f">{num_glyphs}H", cblc, offset + 16)
+        for i, glyph_id in enumerate(glyph_ids):
+            yield _Glyph(glyph_id, image_data_offset + i * image_size, (width, height))
+    else:
+        raise ValueError(f"Unknown CBLC index format {index_format}")
+
+
+def strike_metrics(
+    cblc: _Buffer, cbdt: _Buffer, glyph_ids: Optional[Container[int]] = None
+) -> Dict[int, List[StrikeMetrics]]:
+    """glyph id => its metrics in each strike that has it, from the raw
+    tables. Only glyph_ids, if given, are looked up in cbdt."""
+    # released on the way out, so an mmap they view can always be closed
+    with memoryview(cblc) as cblc, memoryview(cbdt) as cbdt:
+        try:
+            return _strike_metrics(cblc, cbdt, glyph_ids)
+        except struct.error as e:
+            raise ValueError(f"CBLC or CBDT is truncated: {e}")
+
+
+def _strike_metrics(
+    cblc: _Buffer, cbdt: _Buffer, glyph_ids: Optional[Container[int]]
+) -> Dict[int, List[StrikeMetrics]]:
+    result: Dict[int, List[StrikeMetrics]] = {}
+    _, _, num_sizes = _CBLC_HEADER.unpack_from(cblc, 0)
+    for i in range(num_sizes):
+        (
+            array_offset,
+            num_subtables,
+            _,
+            _,
+            ppem_x,
+            ppem_y,
+        ) = _BITMAP_SIZE.unpack_from(cblc, _CBLC_HEADER.size + i * _BITMAP_SIZE.size)
+        for j in range(num_subtables):
+            first, last, additional_offset = _INDEX_SUBTABLE_ARRAY_ENTRY.unpack_from(
+                cblc, array_offset + j * _INDEX_SUBTABLE_ARRAY_ENTRY.size
+            )
+            for glyph in _index_glyphs(
+                cblc, array_offset + additional_offset, first, last
+            ):
+                if glyph_ids is not None and glyph.glyph_id not in glyph_ids:
+                    continue
+                size = glyph.size
+                if size is None:
+                    height, width = _GLYPH_SIZE.unpack_from(cbdt, glyph.offset)
+                    size = (width, height)
+                result.setdefault(glyph.glyph_id, []).append(
+                    StrikeMetrics(ppem_x, ppem_y, *size)
+                )
+    return result
+
+
+@contextlib.contextmanager
+def _raw_table(font: ttLib.TTFont, tag: str) -> Iterator[memoryview]:
+    # The table as it is in the file; never decompiled, only read in full
+    # from a compressed font or one already in memory
+    reader = font.reader
+    if font.isLoaded(tag) or reader is None or reader.flavor is not None:
+        yield memoryview(font.getTableData(tag))
+        return
+    entry = reader.tables[Tag(tag)]
+    if isinstance(reader.file, io.BytesIO):
+        with reader.file.getbuffer() as buf:
+            with buf[entry.offset : entry.offset + entry.length] as view:
+                yield view
+        return
+    with mmap.mmap(reader.file.fileno(), 0, access=mmap.ACCESS_READ) as file_map:
+        with memoryview(file_map) as buf:
+            with buf[entry.offset : entry.offset + entry.length] as view:
+                yield view
+
+
+def font_strike_metrics(
+    font: ttLib.TTFont, glyph_ids: Optional[Container[int]] = None
+) -> Dict[int, List[StrikeMetrics]]:
+    """strike_metrics of font's CBLC and CBDT, empty if it has none."""
+    if "CBLC" not in font or "CBDT" not in font:
+        return {}
+    with _raw_table(font, "CBLC") as cblc, _raw_table(font, "CBDT") as cbdt:
+        return strike_metrics(cblc, cbdt, glyph_ids)
+
+
+def item_glyphs(font: ttLib.TTFont, items: Iterable) -> Dict[int, str]:
+    """Identifier => glyph for each compat item, through its PUA if that is
+    mapped, its codepoints otherwise. Items with no glyph are left out."""
+    cmap = font.getBestCmap() or {}
+    ligatures = None
+    glyphs = {}
+    for item in items:
+        glyph = cmap.get(item.identifier)
+        if glyph is None:
+            names = tuple(cmap.get(cp) for cp in item.codepoints)
+            if None in names:
+                continue
+            if len(names) == 1:
+                glyph = names[0]
+            else:
+                if ligatures is None:
+                    ligatures = (
+                        ligature_index(font["GSUB"].table) if "GSUB" in font else {}
+                    )
+                glyph = ligatures.get(names)
+        if glyph is not None:
+            glyphs[item.identifier] = glyph
+    return glyphs
@@ -12,8 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from array import array
+import dataclasses
+import functools
+import hashlib
+import os
 from pathlib import Path
-from typing import NamedTuple, Tuple
+import shutil
+import struct
+import sys
+import tempfile
+from typing import Iterable, Iterator, NamedTuple, Optional, Tuple
 
 
 # An entry in emoji_metadata.txt
@@ -35,14 +44,300 @@ class CompatEntry(NamedTuple):
         )
 
 
+# Compat entries, or flatbuffer items, as parallel arrays instead of a tuple of
+# tuples per entry. The codepoints of entry i are
+# codepoints[offsets[i] : offsets[i + 1]]. Text entries have no emoji_style,
+# width or height, those columns are 0 until the entries become items.
+@dataclasses.dataclass
+class CompatColumns:
+    identifier: "array[int]"
+    emoji_style: "array[int]"
+    sdk_added: "array[int]"
+    compat_added: "array[int]"
+    width: "array[int]"
+    height: "array[int]"
+    codepoints: "array[int]"
+    offsets: "array[int]"
+
+    @classmethod
+    def empty(cls) -> "CompatColumns":
+        return cls(*(array("i") for _ in range(7)), array("i", [0]))
+
+    @classmethod
+    def from_compat_entries(cls, entries: Iterable[CompatEntry]) -> "CompatColumns":
+        columns = cls.empty()
+        for entry in entries:
+            columns.append(
+                entry.identifier,
+                0,
+                entry.sdk_added,
+                entry.compat_added,
+                0,
+                0,
+                entry.codepoints,
+            )
+        return columns
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple]) -> "CompatColumns":
+        """From (identifier, emoji_style, sdk_added, compat_added, width, height,
+        codepoints), the fields of a FlatbufferItem."""
+        columns = cls.empty()
+        for row in rows:
+            columns.append(*row)
+        return columns
+
+    def append(
+        self,
+        identifier: int,
+        emoji_style: int,
+        sdk_added: int,
+        compat_added: int,
+        width: int,
+        height: int,
+        codepoints: Iterable[int],
+    ):
+        self.identifier.append(identifier)
+        self.emoji_style.append(int(emoji_style))
+        self.sdk_added.append(sdk_added)
+        self.compat_added.append(compat_added)
+        self.width.append(width)
+        self.height.append(height)
+        self.codepoints.extend(codepoints)
+        self.offsets.append(len(self.codepoints))
+
+    def __len__(self) -> int:
+        return len(self.identifier)
+
+    def copy(self) -> "CompatColumns":
+        # every array copied, nothing shared with self
+        return CompatColumns(
+            *(getattr(self, f.name)[:] for f in dataclasses.fields(self))
+        )
+
+    def codepoints_at(self, i: int) -> Tuple[int, ...]:
+        return tuple(self.codepoints[self.offsets[i] : self.offsets[i + 1]])
+
+    def compat_entry(self, i: int) -> CompatEntry:
+        return CompatEntry(
+            self.identifier[i],
+            self.sdk_added[i],
+            self.compat_added[i],
+            self.codepoints_at(i),
+        )
+
+    def compat_entries(self) -> Tuple[CompatEntry, ...]:
+        return tuple(self.compat_entry(i) for i in range(len(self)))
+
+    def row(self, i: int) -> Tuple:
+        """Entry i in FlatbufferItem field order."""
+        return (
+            self.identifier[i],
+            bool(self.emoji_style[i]),
+            self.sdk_added[i],
+            self.compat_added[i],
+            self.width[i],
+            self.height[i],
+            self.codepoints_at(i),
+        )
+
+    def rows(self) -> Iterator[Tuple]:
+        return (self.row(i) for i in range(len(self)))
+
+
+# emoji_metadata.bin holds the parsed contents of emoji_metadata.txt as
+# little-endian arrays, tagged with the sha1 of the text it was compiled from:
+#   header, identifier[n] (I), sdk_added[n] (H), compat_added[n] (H),
+#   codepoint count[n] (B), codepoints[total codepoints] (I)
+_SIDECAR_MAGIC = b"EMJC"
+_SIDECAR_VERSION = 1
+_SIDECAR_HEADER = struct.Struct("<4sI20sII")
+
+
 def emoji_metadata_file() -> Path:
     return Path(__file__).parent / "emoji_metadata.txt"
 
 
-def emoji_compat_metadata() -> Tuple[CompatEntry, ...]:
-    with open(emoji_metadata_file(), "r") as f:
-        return tuple(
-            CompatEntry.fromstring(l)
-            for l in f
-            if l.strip() and not l.strip().startswith("#")
+def emoji_metadata_sidecar_file() -> Path:
+    return Path(__file__).parent / "emoji_metadata.bin"
+
+
+def _parse_emoji_metadata(text: str) -> CompatColumns:
+    # straight into the columns, no CompatEntry per line
+    columns = CompatColumns.empty()
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        parts = line.split(" ", 3)
+        assert len(parts) == 4, line
+        columns.append(
+            int(parts[0], 16),
+            False,
+            int(parts[1]),
+            int(parts[2]),
+            0,
+            0,
+            (int(s, 16) for s in parts[3].split(" ")),
         )
+    return columns
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _read_sidecar(sidecar_file: Path, text_sha1: bytes) -> Optional[CompatColumns]:
+    try:
+        data = sidecar_file.read_bytes()
+    except FileNotFoundError:
+        return None
+    if len(data) < _SIDECAR_HEADER.size:
+        return None
+    magic, version, sha1, num_entries, num_codepoints = _SIDECAR_HEADER.unpack_from(
+        data
+    )
+    if (magic, version, sha1) != (_SIDECAR_MAGIC, _SIDECAR_VERSION, text_sha1):
+        return None  # stale, or not ours
+
+    columns = []
+    offset = _SIDECAR_HEADER.size
+    for typecode, count in (
+        ("I", num_entries),
+        ("H", num_entries),
+        ("H", num_entries),
+        ("B", num_entries),
+        ("I", num_codepoints),
+    ):
+        column = array(typecode)
+        end = offset + count * column.itemsize
+        column.frombytes(data[offset:end])
+        columns.append(_little_endian(column))
+        offset = end
+    if offset != len(data):
+        return None
+    identifiers, sdk_added, compat_added, lengths, codepoints = columns
+
+    offsets = array("i", [0])
+    for length in lengths:
+        offsets.append(offsets[-1] + length)
+    zeros = array("i", [0]) * num_entries
+    return CompatColumns(
+        array("i", identifiers),
+        array("i", zeros),
+        array("i", sdk_added),
+        array("i", compat_added),
+        array("i", zeros),
+        array("i", zeros),
+        array("i", codepoints),
+        offsets,
+    )
+
+
+def write_atomically(path: Path, data: bytes):
+    """Write data alongside path and move it into place, so readers see all
+    of the old file or all of the new one."""
+    fd, tmp_path = tempfile.mkstemp(prefix=path.name, dir=path.parent)
+    try:
+        if path.exists():
+            shutil.copymode(path, tmp_path)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def write_sidecar(columns: CompatColumns, text: bytes, sidecar_file: Path):
+    """Write the binary sidecar for text, which columns must be the parse of."""
+    codepoints = array("I", columns.codepoints)
+    offsets = columns.offsets
+    parts = [
+        _SIDECAR_HEADER.pack(
+            _SIDECAR_MAGIC,
+            _SIDECAR_VERSION,
+            hashlib.sha1(text).digest(),
+            len(columns),
+            len(codepoints),
+        )
+    ]
+    for column in (
+        array("I", columns.identifier),
+        array("H", columns.sdk_added),
+        array("H", columns.compat_added),
+        array("B", (offsets[i + 1] - offsets[i] for i in range(len(columns)))),
+        codepoints,
+    ):
+        parts.append(_little_endian(column).tobytes())
+    write_atomically(sidecar_file, b"".join(parts))
+
+
+def compile_emoji_metadata(
+    text_file: Optional[Path] = None, sidecar_file: Optional[Path] = None
+):
+    """(Re)write the binary sidecar for emoji_metadata.txt."""
+    text_file = text_file or emoji_metadata_file()
+    sidecar_file = sidecar_file or emoji_metadata_sidecar_file()
+
+    text = text_file.read_bytes()
+    write_sidecar(_parse_emoji_metadata(text.decode("utf-8")), text, sidecar_file)
+
+
+def _load_emoji_metadata(
+    text_file: Path, sidecar_file: Optional[Path]
+) -> Tuple[CompatColumns, bytes]:
+    # The columns and the sha1 of the text, which is read just the once. The
+    # sidecar is only used if it was compiled from exactly this text.
+    text = text_file.read_bytes()
+    sha1 = hashlib.sha1(text).digest()
+    columns = None
+    if sidecar_file is not None:
+        columns = _read_sidecar(sidecar_file, sha1)
+    if columns is None:
+        columns = _parse_emoji_metadata(text.decode("utf-8"))
+    return columns, sha1
+
+
+def load_emoji_metadata_columns(
+    text_file: Path, sidecar_file: Optional[Path] = None
+) -> CompatColumns:
+    return _load_emoji_metadata(text_file, sidecar_file)[0]
+
+
+def load_emoji_metadata(
+    text_file: Path, sidecar_file: Optional[Path] = None
+) -> Tuple[CompatEntry, ...]:
+    return load_emoji_metadata_columns(text_file, sidecar_file).compat_entries()
+
+
+@functools.lru_cache(maxsize=None)
+def _emoji_compat_metadata() -> Tuple[CompatColumns, str]:
+    # Read and hashed once per process; call clear_emoji_compat_metadata_cache()
+    # after editing emoji_metadata.txt to see the changes
+    columns, sha1 = _load_emoji_metadata(
+        emoji_metadata_file(), emoji_metadata_sidecar_file()
+    )
+    return columns, sha1.hex()
+
+
+def emoji_compat_metadata_columns() -> CompatColumns:
+    # A copy, the caller's to change without touching the cached columns
+    return _emoji_compat_metadata()[0].copy()
+
+
+@functools.lru_cache(maxsize=None)
+def emoji_compat_metadata() -> Tuple[CompatEntry, ...]:
+    return _emoji_compat_metadata()[0].compat_entries()
+
+
+def emoji_compat_metadata_sha1() -> str:
+    # Identifies the metadata emoji_compat_metadata() returns
+    return _emoji_compat_metadata()[1]
+
+
+def clear_emoji_compat_metadata_cache():
+    _emoji_compat_metadata.cache_clear()
+    emoji_compat_metadata.cache_clear()
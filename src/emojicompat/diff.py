@@ -0,0 +1,195 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""What changed between two Emji lists.
+
+Entries are matched by codepoint sequence first, then leftovers by
+identifier, in one pass over each side's items. Lists with the same
+content digest are equal without looking at a single item.
+"""
+
+from collections import deque
+import dataclasses
+from emojicompat.flatbuffer import (
+    FlatbufferItem,
+    FlatbufferList,
+    FlatbufferListView,
+    source_sha_bytes,
+)
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+
+FlatList = Union[FlatbufferList, FlatbufferListView]
+
+# The fields compared once two entries are matched up
+_FIELDS = FlatbufferItem._fields
+
+
+class ItemChange(NamedTuple):
+    before: FlatbufferItem
+    after: FlatbufferItem
+
+    def fields(self) -> Tuple[str, ...]:
+        return tuple(
+            f
+            for f, b, a in zip(_FIELDS, self.before, self.after)
+            if b != a and f != "identifier"
+        )
+
+
+@dataclasses.dataclass
+class MetadataDiff:
+    version: Optional[Tuple[int, int]] = None
+    source_sha: Optional[Tuple[object, object]] = None
+    added: List[FlatbufferItem] = dataclasses.field(default_factory=list)
+    removed: List[FlatbufferItem] = dataclasses.field(default_factory=list)
+    # same codepoints, new identifier; other fields may have changed too
+    remapped: List[ItemChange] = dataclasses.field(default_factory=list)
+    # same identifier, some other field changed. When the codepoints changed
+    # the sequence itself didn't match up, only the identifier did.
+    changed: List[ItemChange] = dataclasses.field(default_factory=list)
+    # the same entries, in a different order
+    reordered: bool = False
+
+    def __bool__(self) -> bool:
+        return any(
+            (
+                self.version,
+                self.source_sha,
+                self.added,
+                self.removed,
+                self.remapped,
+                self.changed,
+                self.reordered,
+            )
+        )
+
+    def lines(self) -> Iterator[str]:
+        if self.version is not None:
+            yield f"version {self.version[0]} -> {self.version[1]}"
+        if self.source_sha is not None:
+            yield f"source_sha {self.source_sha[0]} -> {self.source_sha[1]}"
+        for item in self.removed:
+            yield f"- {_describe(item)}"
+        for item in self.added:
+            yield f"+ {_describe(item)}"
+        for change in self.remapped:
+            yield (
+                f"~ {_codepoints(change.after)} identifier "
+                f"U+{change.before.identifier:04x} -> U+{change.after.identifier:04x}"
+                + "".join(f", {f}" for f in _field_changes(change))
+            )
+        for change in self.changed:
+            yield f"! U+{change.after.identifier:04x} " + ", ".join(
+                _field_changes(change)
+            )
+        if self.reordered:
+            yield "entries reordered"
+        yield (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.remapped)} remapped, {len(self.changed)} changed"
+        )
+
+
+def _codepoints(item: FlatbufferItem) -> str:
+    return ",".join(f"U+{c:04x}" for c in item.codepoints)
+
+
+def _describe(item: FlatbufferItem) -> str:
+    return f"U+{item.identifier:04x} {_codepoints(item)}"
+
+
+def _field_changes(change: ItemChange) -> Iterator[str]:
+    for field in change.fields():
+        if field == "codepoints":
+            before, after = _codepoints(change.before), _codepoints(change.after)
+        else:
+            before, after = getattr(change.before, field), getattr(change.after, field)
+        yield f"{field} {before} -> {after}"
+
+
+def content_digest(flat_list: FlatList) -> bytes:
+    """Equal digests mean equal lists; cached, except for a FlatbufferList
+    of item tuples.
+
+    Lists that are equal may still have different digests, a view and a
+    FlatbufferList never share one."""
+    return flat_list.digest()
+
+
+def _items(flat_list: FlatList) -> List[FlatbufferItem]:
+    if isinstance(flat_list, FlatbufferListView):
+        # one pass over the buffer beats decoding item by item
+        return [FlatbufferItem._make(row) for row in flat_list.tocolumns().rows()]
+    return list(flat_list.items)
+
+
+def _pop_first(indices: Dict[Any, Deque[int]], key) -> Optional[int]:
+    left = indices.get(key)
+    if not left:
+        return None
+    return left.popleft()
+
+
+def diff(before: FlatList, after: FlatList) -> MetadataDiff:
+    result = MetadataDiff()
+    if content_digest(before) == content_digest(after):
+        return result
+
+    if before.version != after.version:
+        result.version = (before.version, after.version)
+    if source_sha_bytes(before.source_sha) != source_sha_bytes(after.source_sha):
+        result.source_sha = (before.source_sha, after.source_sha)
+
+    before_items = _items(before)
+    after_items = _items(after)
+
+    # codepoints => indices into before_items, of those not matched yet.
+    # Sequences may repeat, each after entry takes the first one left.
+    by_codepoints: Dict[Tuple[int, ...], Deque[int]] = {}
+    for i, item in enumerate(before_items):
+        by_codepoints.setdefault(item.codepoints, deque()).append(i)
+
+    changed: List[Tuple[int, ItemChange]] = []
+    unmatched_after = []
+    for i, item in enumerate(after_items):
+        old = _pop_first(by_codepoints, item.codepoints)
+        if old is None:
+            unmatched_after.append(i)
+            continue
+        old = before_items[old]
+        if old.identifier != item.identifier:
+            result.remapped.append(ItemChange(old, item))
+        elif old != item:
+            changed.append((i, ItemChange(old, item)))
+
+    # entries whose codepoints changed still match up by identifier
+    unmatched_before = sorted(i for left in by_codepoints.values() for i in left)
+    by_identifier: Dict[int, Deque[int]] = {}
+    for i in unmatched_before:
+        by_identifier.setdefault(before_items[i].identifier, deque()).append(i)
+    matched = set()
+    for i in unmatched_after:
+        item = after_items[i]
+        old = _pop_first(by_identifier, item.identifier)
+        if old is None:
+            result.added.append(item)
+        else:
+            matched.add(old)
+            changed.append((i, ItemChange(before_items[old], item)))
+    result.removed.extend(before_items[i] for i in unmatched_before if i not in matched)
+    result.changed.extend(change for _, change in sorted(changed, key=lambda c: c[0]))
+    if not result and before_items != after_items:
+        result.reordered = True
+    return result
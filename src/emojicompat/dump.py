@@ -0,0 +1,387 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Dump the items of an Emji list as text, JSON Lines, CSV or binary.
+
+Rows are picked through a DumpIndex over the list's columns, so a filter
+only formats the rows it matches, and output is written a chunk of lines
+at a time rather than a print per line.
+"""
+
+from array import array
+import bisect
+import csv
+import dataclasses
+from emojicompat.compat_metadata import CompatColumns
+import functools
+import io
+import itertools
+import json
+import struct
+import sys
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+
+FORMATS = ("text", "jsonl", "csv", "binary")
+
+_CHUNK_LINES = 1024
+
+
+class IntRange(NamedTuple):
+    """Inclusive, None for unbounded."""
+
+    start: Optional[int] = None
+    end: Optional[int] = None
+
+    @classmethod
+    def fromstring(cls, value: str, parse: Callable[[str], int] = int) -> "IntRange":
+        """From "A-B", "A-", "-B" or just "A", each number read by parse."""
+        start, sep, end = value.partition("-")
+        start = parse(start) if start.strip() else None
+        if not sep:
+            return cls(start, start)
+        return cls(start, parse(end) if end.strip() else None)
+
+
+def parse_codepoint(value: str) -> int:
+    """From hex, with or without a U+ or 0x prefix."""
+    value = value.strip()
+    if value[:2].lower() in ("u+", "0x"):
+        value = value[2:]
+    return int(value, 16)
+
+
+def parse_codepoint_range(value: str) -> IntRange:
+    """Hex, like parse_codepoint, so F0000-F00FF."""
+    return IntRange.fromstring(value, parse_codepoint)
+
+
+# Which items to dump. Every field set must match, the default matches all.
+@dataclasses.dataclass(frozen=True)
+class DumpFilter:
+    identifier: Optional[IntRange] = None
+    # contained anywhere in the item's codepoints
+    codepoint: Optional[int] = None
+    sdk_added: Optional[IntRange] = None
+    compat_added: Optional[IntRange] = None
+    emoji_style: Optional[bool] = None
+
+
+class _SortedColumn:
+    """Rows of a column ordered by value, for range queries."""
+
+    def __init__(self, column: array):
+        self.rows = sorted(range(len(column)), key=column.__getitem__)
+        self.keys = [column[i] for i in self.rows]
+
+    def rows_in(self, value_range: IntRange) -> List[int]:
+        start = 0
+        end = len(self.keys)
+        if value_range.start is not None:
+            start = bisect.bisect_left(self.keys, value_range.start)
+        if value_range.end is not None:
+            end = bisect.bisect_right(self.keys, value_range.end)
+        return self.rows[start:end]
+
+
+class DumpIndex:
+    """Indexes over the columns of one list, each built on first use."""
+
+    def __init__(self, columns: CompatColumns):
+        self.columns = columns
+
+    @functools.cached_property
+    def _by_identifier(self) -> _SortedColumn:
+        return _SortedColumn(self.columns.identifier)
+
+    @functools.cached_property
+    def _by_sdk_added(self) -> _SortedColumn:
+        return _SortedColumn(self.columns.sdk_added)
+
+    @functools.cached_property
+    def _by_compat_added(self) -> _SortedColumn:
+        return _SortedColumn(self.columns.compat_added)
+
+    @functools.cached_property
+    def _by_codepoint(self) -> Dict[int, List[int]]:
+        index: Dict[int, List[int]] = {}
+        offsets = self.columns.offsets
+        codepoints = self.columns.codepoints
+        for i in range(len(self.columns)):
+            for cp in set(codepoints[offsets[i] : offsets[i + 1]]):
+                index.setdefault(cp, []).append(i)
+        return index
+
+    @functools.cached_property
+    def _by_emoji_style(self) -> Dict[bool, List[int]]:
+        index: Dict[bool, List[int]] = {True: [], False: []}
+        for i, emoji_style in enumerate(self.columns.emoji_style):
+            index[bool(emoji_style)].append(i)
+        return index
+
+    def select(self, dump_filter: DumpFilter) -> Sequence[int]:
+        """Rows matching dump_filter, in list order."""
+        matches: List[Sequence[int]] = []
+        if dump_filter.identifier is not None:
+            matches.append(self._by_identifier.rows_in(dump_filter.identifier))
+        if dump_filter.codepoint is not None:
+            matches.append(self._by_codepoint.get(dump_filter.codepoint, []))
+        if dump_filter.sdk_added is not None:
+            matches.append(self._by_sdk_added.rows_in(dump_filter.sdk_added))
+        if dump_filter.compat_added is not None:
+            matches.append(self._by_compat_added.rows_in(dump_filter.compat_added))
+        if dump_filter.emoji_style is not None:
+            matches.append(self._by_emoji_style[dump_filter.emoji_style])
+
+        if not matches:
+            return range(len(self.columns))
+        matches.sort(key=len)
+        rows = set(matches[0])
+        for other in matches[1:]:
+            if not rows:
+                break
+            rows.intersection_update(other)
+        return sorted(rows)
+
+
+def _write_lines(out: TextIO, lines: Iterable[str]):
+    lines = iter(lines)
+    while True:
+        chunk = list(itertools.islice(lines, _CHUNK_LINES))
+        if not chunk:
+            return
+        out.write("".join(chunk))
+
+
+def _text_lines(
+    version: int,
+    source_sha: Union[str, bytes, None],
+    columns: CompatColumns,
+    rows: Iterable[int],
+) -> Iterator[str]:
+    yield f"version {version}\n"
+    yield "identifier emoji_style sdk_added compat_added width height codepoints\n"
+    for i in rows:
+        identifier = f"U+{columns.identifier[i]:04x}"
+        codepoints = ",".join(
+            f"U+{c:04x}"
+            for c in columns.codepoints[columns.offsets[i] : columns.offsets[i + 1]]
+        )
+        yield (
+            f"{identifier:>10} {bool(columns.emoji_style[i]):11} "
+            f"{columns.sdk_added[i]:9} {columns.compat_added[i]:12} "
+            f"{columns.width[i]:5} {columns.height[i]:6} {codepoints:>10}\n"
+        )
+    yield f"source_sha {source_sha}\n"
+
+
+def _sha_text(source_sha: Union[str, bytes, None]) -> Optional[str]:
+    if isinstance(source_sha, (bytes, bytearray)):
+        return source_sha.decode("utf-8", "backslashreplace")
+    return source_sha
+
+
+def _jsonl_lines(
+    version: int,
+    source_sha: Union[str, bytes, None],
+    columns: CompatColumns,
+    rows: Iterable[int],
+    font: Optional[str],
+) -> Iterator[str]:
+    # a header record for the list, then one per item
+    header = {"version": version, "source_sha": _sha_text(source_sha)}
+    if font is not None:
+        header = {"font": font, **header}
+    yield json.dumps(header) + "\n"
+    # every item field is an int or a bool so there is nothing to escape
+    for i in rows:
+        codepoints = ", ".join(
+            map(str, columns.codepoints[columns.offsets[i] : columns.offsets[i + 1]])
+        )
+        yield (
+            f'{{"identifier": {columns.identifier[i]}, '
+            f'"emoji_style": {"true" if columns.emoji_style[i] else "false"}, '
+            f'"sdk_added": {columns.sdk_added[i]}, '
+            f'"compat_added": {columns.compat_added[i]}, '
+            f'"width": {columns.width[i]}, "height": {columns.height[i]}, '
+            f'"codepoints": [{codepoints}]}}\n'
+        )
+
+
+CSV_HEADER = (
+    "font,version,source_sha,"
+    "identifier,emoji_style,sdk_added,compat_added,width,height,codepoints\n"
+)
+
+
+def _csv_lines(
+    version: int,
+    source_sha: Union[str, bytes, None],
+    columns: CompatColumns,
+    rows: Iterable[int],
+    font: Optional[str],
+) -> Iterator[str]:
+    # The fields of the list, the same on every row, are quoted as needed once.
+    # Codepoints are space separated so no item field ever needs quoting.
+    list_fields = io.StringIO()
+    csv.writer(list_fields, lineterminator="").writerow(
+        (font or "", version, _sha_text(source_sha) or "")
+    )
+    prefix = list_fields.getvalue()
+    yield CSV_HEADER
+    for i in rows:
+        codepoints = " ".join(
+            map(str, columns.codepoints[columns.offsets[i] : columns.offsets[i + 1]])
+        )
+        yield (
+            f"{prefix},{columns.identifier[i]},{int(bool(columns.emoji_style[i]))},"
+            f"{columns.sdk_added[i]},{columns.compat_added[i]},"
+            f"{columns.width[i]},{columns.height[i]},{codepoints}\n"
+        )
+
+
+# The binary dump is the columns of CompatColumns as little-endian int32 arrays:
+#   header, source_sha, identifier[n], emoji_style[n], sdk_added[n],
+#   compat_added[n], width[n], height[n], offsets[n + 1], codepoints[total]
+_BINARY_MAGIC = b"EMJD"
+_BINARY_VERSION = 1
+# magic, format version, list version, n, total codepoints, source_sha length
+_BINARY_HEADER = struct.Struct("<4sIiIII")
+
+
+def _column_arrays(columns: CompatColumns) -> Tuple[array, ...]:
+    return (
+        columns.identifier,
+        columns.emoji_style,
+        columns.sdk_added,
+        columns.compat_added,
+        columns.width,
+        columns.height,
+        columns.offsets,
+        columns.codepoints,
+    )
+
+
+def _little_endian(values: array) -> array:
+    if sys.byteorder == "little":
+        return values
+    values = array(values.typecode, values)
+    values.byteswap()
+    return values
+
+
+def _sha_bytes(source_sha: Union[str, bytes, None]) -> bytes:
+    if source_sha is None:
+        return b""
+    if isinstance(source_sha, str):
+        return source_sha.encode("utf-8")
+    return bytes(source_sha)
+
+
+def write_binary(
+    out: BinaryIO,
+    version: int,
+    source_sha: Union[str, bytes, None],
+    columns: CompatColumns,
+):
+    sha = _sha_bytes(source_sha)
+    out.write(
+        _BINARY_HEADER.pack(
+            _BINARY_MAGIC,
+            _BINARY_VERSION,
+            version,
+            len(columns),
+            len(columns.codepoints),
+            len(sha),
+        )
+    )
+    out.write(sha)
+    for values in _column_arrays(columns):
+        out.write(_little_endian(values).tobytes())
+
+
+def read_binary(data: bytes) -> Tuple[int, CompatColumns, bytes]:
+    """(version, columns, source_sha) from write_binary output."""
+    (
+        magic,
+        format_version,
+        version,
+        num_items,
+        num_codepoints,
+        sha_length,
+    ) = _BINARY_HEADER.unpack_from(data, 0)
+    if magic != _BINARY_MAGIC or format_version != _BINARY_VERSION:
+        raise ValueError(f"Not a version {_BINARY_VERSION} binary dump")
+    offset = _BINARY_HEADER.size
+    source_sha = bytes(data[offset : offset + sha_length])
+    offset += sha_length
+
+    columns = CompatColumns.empty()
+    sizes = [num_items] * 6 + [num_items + 1, num_codepoints]
+    for values, size in zip(_column_arrays(columns), sizes):
+        del values[:]
+        end = offset + 4 * size
+        if end > len(data):
+            raise ValueError("Binary dump is truncated")
+        values.frombytes(data[offset:end])
+        if sys.byteorder != "little":
+            values.byteswap()
+        offset = end
+    return version, columns, source_sha
+
+
+def _select_columns(columns: CompatColumns, rows: Sequence[int]) -> CompatColumns:
+    if isinstance(rows, range) and len(rows) == len(columns):
+        return columns
+    return CompatColumns.from_rows(columns.row(i) for i in rows)
+
+
+def write_dump(
+    out: Union[TextIO, BinaryIO],
+    version: int,
+    source_sha: Union[str, bytes, None],
+    columns: CompatColumns,
+    dump_format: str = "text",
+    dump_filter: DumpFilter = DumpFilter(),
+    font: Optional[str] = None,
+):
+    """Write the items of columns matching dump_filter to out, a binary
+    stream for binary and a text stream otherwise. jsonl and csv also name
+    font, the file the list came from, if given."""
+    rows = DumpIndex(columns).select(dump_filter)
+    if dump_format == "text":
+        _write_lines(out, _text_lines(version, source_sha, columns, rows))
+    elif dump_format == "jsonl":
+        _write_lines(out, _jsonl_lines(version, source_sha, columns, rows, font))
+    elif dump_format == "csv":
+        _write_lines(out, _csv_lines(version, source_sha, columns, rows, font))
+    elif dump_format == "binary":
+        write_binary(out, version, source_sha, _select_columns(columns, rows))
+    else:
+        raise ValueError(
+            f"Unknown dump format {dump_format}, expected one of {FORMATS}"
+        )
@@ -14,29 +14,142 @@
 
 from absl import app
 from absl import flags
+import contextlib
 import dataclasses
-from emojicompat.compat_metadata import emoji_compat_metadata
-from emojicompat.flatbuffer import FlatbufferItem, FlatbufferList
-from emojicompat.util import bfs_base_table
+from emojicompat.compat_metadata import (
+    CompatColumns,
+    emoji_compat_metadata_columns,
+    emoji_compat_metadata_sha1,
+)
+import emojicompat
+from emojicompat import bitmap_metrics
+from emojicompat import diff
+from emojicompat import dump
+from emojicompat.flatbuffer import FlatbufferItem, FlatbufferList, FlatbufferListView
+from emojicompat import sfnt_patch
+from emojicompat import timing
+from emojicompat.sequence_trie import SequenceTrie
+from emojicompat.util import (
+    cmap_index,
+    forget_cmap_index,
+    keep_cmap_index,
+    ligature_subtables,
+)
 from fontTools import ttLib
-from fontTools.ttLib.tables import otTables as ot
+from fontTools.misc.fixedTools import fixedToFloat, floatToFixed
+from fontTools.misc.textTools import Tag
+from fontTools.ttLib.tables.DefaultTable import DefaultTable
+import glob
 import hashlib
 import io
+import json
+import os
 from pathlib import Path
+import shutil
+import struct
 import sys
+import tempfile
+import weakref
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    TextIO,
+    Tuple,
+)
 
 
-_LOOKUP_TYPE_LIGATURE = 4
+# source_sha computed by --source_hash=tables is recorded with this prefix
+_TABLES_HASH_PREFIX = "tables:"
 
 
 FLAGS = flags.FLAGS
 
 
 flags.DEFINE_enum(
-    "op", "dump", ["dump", "setup", "setup_pua", "check"], "What job to do."
+    "op",
+    "dump",
+    ["dump", "setup", "setup_pua", "check", "diff"],
+    "What job to do. diff takes two fonts, before and after, and exits 1 if "
+    "their metadata differs.",
+)
+flags.DEFINE_multi_string(
+    "font", None, "Font to process. Repeat, or use a glob, for several fonts."
+)
+flags.DEFINE_string(
+    "fonts_from",
+    None,
+    "File listing fonts to process, one path or glob per line. # starts a comment.",
+)
+flags.DEFINE_integer(
+    "jobs", 1, "How many fonts to process in parallel when given several."
+)
+flags.DEFINE_bool(
+    "profile",
+    False,
+    "Print wall time, CPU time and peak traced memory of each stage as JSON lines.",
+)
+flags.DEFINE_bool(
+    "lazy",
+    False,
+    "Only decompile what emojicompat reads, cmap, GSUB, meta and the bitmap "
+    "headers. Every other table is copied through as raw bytes.",
+)
+flags.DEFINE_bool(
+    "patch",
+    False,
+    "Save by copying the tables that weren't changed byte for byte from the "
+    "source font and compiling only the rest. Plain sfnt fonts only.",
+)
+flags.DEFINE_bool(
+    "incremental",
+    False,
+    "Skip setup/setup_pua of fonts that haven't changed since the last valid "
+    "run. A fingerprint is kept in a .emojicompat.json file next to each font.",
+)
+flags.DEFINE_enum(
+    "source_hash",
+    "font",
+    ["font", "tables"],
+    "How setup computes source_sha. font hashes the whole saved font before any "
+    "changes. tables hashes each table of the font as setup saves it, reading "
+    "untouched tables straight from the file; check can verify it.",
+)
+flags.DEFINE_enum(
+    "dump_format",
+    "text",
+    list(dump.FORMATS),
+    "How --op dump writes the items. jsonl starts with a record of the list's "
+    "version and source_sha, csv repeats them on every row. binary is the list "
+    "as little-endian int32 columns, for one font only.",
+)
+flags.DEFINE_string(
+    "dump_identifiers",
+    None,
+    "Only dump items with an identifier in this inclusive range, in hex, e.g. "
+    "F0000-F00FF. Either end may be left out.",
+)
+flags.DEFINE_string(
+    "dump_codepoint",
+    None,
+    "Only dump items whose codepoints include this one, in hex, e.g. 1F600.",
+)
+flags.DEFINE_string(
+    "dump_sdk_added", None, "Only dump items with sdk_added in this range, e.g. 23-."
+)
+flags.DEFINE_string(
+    "dump_compat_added",
+    None,
+    "Only dump items with compat_added in this range, e.g. 5 or 3-7.",
+)
+flags.DEFINE_bool(
+    "dump_emoji_style",
+    None,
+    "Only dump items that are (or with --nodump_emoji_style, aren't) emoji style.",
 )
-flags.DEFINE_string("font", None, "Font to process")
-flags.mark_flag_as_required("font")
 
 
 @dataclasses.dataclass
@@ -53,6 +166,42 @@ class PuaCheckResult:
         print(f"{self.missing} Emji entries did NOT match a glyph")
 
 
+# How to process each font
+@dataclasses.dataclass(frozen=True)
+class ProcessOptions:
+    source_hash: str = "font"
+    lazy: bool = False
+    patch: bool = False
+    profile: bool = False
+    incremental: bool = False
+    dump_format: str = "text"
+    dump_filter: dump.DumpFilter = dump.DumpFilter()
+
+    @classmethod
+    def fromflags(cls) -> "ProcessOptions":
+        return cls(
+            FLAGS.source_hash,
+            FLAGS.lazy,
+            FLAGS.patch,
+            FLAGS.profile,
+            FLAGS.incremental,
+            FLAGS.dump_format,
+            _dump_filter_from_flags(),
+        )
+
+
+# What processing one font produced
+@dataclasses.dataclass
+class FontResult:
+    font: Path
+    valid: bool
+    pua: Optional[PuaCheckResult] = None
+    # what was printed while processing, only captured in batch mode
+    output: str = ""
+    # the stage timings with --profile, JSON lines, only captured in batch mode
+    stages: str = ""
+
+
 def _definitely_not_emoji(cp: int) -> bool:
     return (
         # asci control, space
@@ -65,32 +214,113 @@ def _definitely_not_emoji(cp: int) -> bool:
     )
 
 
-def _dump(flat_list: FlatbufferList):
-    item_title = "identifier emoji_style sdk_added compat_added width height codepoints"
-    item_format = "{identifier:>10} {emoji_style:11} {sdk_added:9} {compat_added:12} {width:5} {height:6} {codepoints:>10}"
-    print("version", flat_list.version)
-    print(item_title)
-    for item in flat_list.items:
-        fields = item._asdict()
-        fields["identifier"] = f"U+{fields['identifier']:04x}"
-        fields["codepoints"] = ",".join(f"U+{c:04x}" for c in fields["codepoints"])
-        print(item_format.format(**fields))
-    print("source_sha", flat_list.source_sha)
+def _dump(
+    flat_list: FlatbufferList,
+    dump_format: str = "text",
+    dump_filter: dump.DumpFilter = dump.DumpFilter(),
+    font_path: Optional[Path] = None,
+):
+    if dump_format == "binary":
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+    else:
+        out = sys.stdout
+    dump.write_dump(
+        out,
+        flat_list.version,
+        flat_list.source_sha,
+        flat_list.tocolumns(),
+        dump_format,
+        dump_filter,
+        str(font_path) if font_path is not None else None,
+    )
+    out.flush()
+
+
+class _Sha1Sink:
+    """Write-only file-like object that feeds everything written into SHA-1."""
+
+    def __init__(self):
+        self._sha1 = hashlib.sha1()
+        self._length = 0
+
+    def write(self, data) -> int:
+        self._sha1.update(data)
+        self._length += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._length
+
+    def hexdigest(self) -> str:
+        return self._sha1.hexdigest()
 
 
 def _hash_of_font_without_compat_data(font: ttLib.TTFont) -> str:
     # ensuring meta is present makes the hash stable on repeat runs against an input font w/o meta
     if "meta" not in font:
         font["meta"] = ttLib.newTable("meta")
-    font["meta"].data.pop("Emji", None)
-
-    font_io = io.BytesIO()
-    font.save(font_io)
-    sha1 = hashlib.sha1()
-    sha1.update(font_io.getvalue())
-    font_io.close()
-
-    return sha1.hexdigest()
+    emji = font["meta"].data.pop("Emji", None)
+
+    # save straight into the hash rather than into yet another copy of the font
+    sink = _Sha1Sink()
+    try:
+        font.save(sink)
+    finally:
+        if emji is not None:
+            font["meta"].data["Emji"] = emji
+
+    return sink.hexdigest()
+
+
+def _table_data_without_compat_data(font: ttLib.TTFont, tag: str) -> bytes:
+    if tag == "head":
+        # checkSumAdjustment and modified change on every save
+        data = bytearray(font.getTableData(tag))
+        data[8:12] = bytes(4)
+        data[28:36] = bytes(8)
+        return bytes(data)
+    if tag != "meta":
+        # raw bytes from the file unless the table has been loaded
+        return font.getTableData(tag)
+    meta = ttLib.newTable("meta")
+    meta.data = {k: v for k, v in font["meta"].data.items() if k != "Emji"}
+    if not meta.data:
+        return b""
+    return meta.compile(font)
+
+
+def _hash_of_tables_without_compat_data(font: ttLib.TTFont) -> str:
+    # One table at a time, so we never hold more than the largest table.
+    # Tables nobody has loaded are hashed as is, nothing gets recompiled.
+    sink = _Sha1Sink()
+    for tag in sorted(font.keys()):
+        if tag == "GlyphOrder":
+            continue
+        data = _table_data_without_compat_data(font, tag)
+        if not data:
+            continue
+        sink.write(Tag(tag).tobytes())
+        sink.write(struct.pack(">I", len(data)))
+        sink.write(data)
+    return sink.hexdigest()
+
+
+def _check_source_sha(font: ttLib.TTFont, flat_list: FlatbufferList) -> bool:
+    # Must run before anything modifies the font in memory
+    recorded = flat_list.source_sha or ""
+    if isinstance(recorded, bytes):
+        recorded = recorded.decode("utf-8")
+    if not recorded.startswith(_TABLES_HASH_PREFIX):
+        # the whole font hash includes the time of saving; nothing to compare
+        return True
+    actual = _TABLES_HASH_PREFIX + _hash_of_tables_without_compat_data(font)
+    if recorded != actual:
+        print(f"WARNING: source_sha {recorded} does not match the font, {actual}")
+        print("         The font changed after setup; run setup again")
+        return False
+    print("source_sha matches the font")
+    return True
 
 
 def _setup_meta(font: ttLib.TTFont, flat_list: FlatbufferList):
@@ -99,56 +329,64 @@ def _setup_meta(font: ttLib.TTFont, flat_list: FlatbufferList):
     font["meta"].data["Emji"] = flat_list.toflatbytes()
 
 
+def _update_meta(
+    font: ttLib.TTFont, flat_list: FlatbufferList, flat_compat: FlatbufferList
+) -> FlatbufferList:
+    # source_sha read from a font is bytes, the one we compute is str
+    source_sha = flat_compat.source_sha
+    if isinstance(source_sha, str):
+        source_sha = source_sha.encode("utf-8")
+    if flat_compat._replace(source_sha=source_sha) != flat_list:
+        print("Updating 'meta'")
+        _setup_meta(font, flat_compat)
+        return flat_compat
+    print("'meta' is already correct")
+    return flat_list
+
+
 def _setup_pua(font: ttLib.TTFont, flat_list: FlatbufferList) -> PuaCheckResult:
     # Target Android-style cmap rigging: there should be one format 12 we add to
-    cmap_tables = [t for t in font["cmap"].tables if t.format == 12]
-
     # if we have many format 12 tables they should be identical
-    if len(set(tuple(t.cmap.items()) for t in cmap_tables)) != 1:
-        raise ValueError("All format 12 cmaps should be identical")
-    cmap_table = cmap_tables[0]
-    reverse_cmap = {
-        k: v for k, v in cmap_table.cmap.items() if not _definitely_not_emoji(k)
-    }
-    assert len(reverse_cmap) == len(
-        set(reverse_cmap.values())
-    ), "Can't safely reverse if values are non-unique"
-    reverse_cmap = {v: k for k, v in reverse_cmap.items()}
+    index = cmap_index(font, _definitely_not_emoji)
+    cmap = index.cmaps[0]
+    reverse_cmap = index.reverse
 
-    items_by_codepoints = {e.codepoints: e for e in flat_list.items}
+    items_by_codepoints = SequenceTrie((e.codepoints, e) for e in flat_list.items)
 
     result = PuaCheckResult()
+    only_pua_changed = True
 
     def _update_pua_entry(entry: FlatbufferItem, target_glyph: str):
-        nonlocal result, items_by_codepoints
-        if entry.identifier not in cmap_table.cmap:
+        nonlocal result, items_by_codepoints, only_pua_changed
+        if entry.identifier not in cmap:
             result.added += 1
-        elif cmap_table.cmap[entry.identifier] == target_glyph:
+        elif cmap[entry.identifier] == target_glyph:
             result.correct += 1
         else:
             result.fixed += 1
-        cmap_table.cmap[entry.identifier] = target_glyph
+        if not _definitely_not_emoji(entry.identifier):
+            only_pua_changed = False
+        cmap[entry.identifier] = target_glyph
         items_by_codepoints.pop(entry.codepoints)
 
     # Multi-codepoint sequences hide in GSUB as ligatures
     # Go find them and figure out the non-pua activation sequence
-    for path in bfs_base_table(font["GSUB"].table, 'font["GSUB"]'):
-        liga_subst = path[-1].value
-        # if not isinstance(entry, ot.Lookup) or not not entry.LookupType == _LOOKUP_TYPE_LIGATURE:
-        #     continue
-        if not isinstance(liga_subst, ot.LigatureSubst):
-            continue
-
-        # for liga_subst in entry.SubTable:
-        for start_glyph, ligatures in liga_subst.ligatures.items():
-            for ligature in ligatures:
-                activation = tuple(
-                    reverse_cmap[glyph_name]
-                    for glyph_name in [start_glyph] + ligature.Component
-                )
-                entry = items_by_codepoints.get(activation, None)
-                if entry:
-                    _update_pua_entry(entry, ligature.LigGlyph)
+    if "GSUB" in font:
+        # Walk the trie as we go, giving up at the first glyph with no
+        # codepoint, or whose codepoint no compat entry continues with
+        root = items_by_codepoints.root
+        for liga_subst in ligature_subtables(font["GSUB"].table):
+            for start_glyph, ligatures in liga_subst.ligatures.items():
+                start = root.child(reverse_cmap.get(start_glyph))
+                if start is None:
+                    continue
+                for ligature in ligatures:
+                    node = start.descend(
+                        reverse_cmap.get(glyph_name)
+                        for glyph_name in ligature.Component
+                    )
+                    if node is not None and node.has_value:
+                        _update_pua_entry(node.value, ligature.LigGlyph)
 
     # Single-codepoint lives directly in cmap
     single_cp_items = [
@@ -156,19 +394,88 @@ def _setup_pua(font: ttLib.TTFont, flat_list: FlatbufferList) -> PuaCheckResult:
     ]
     for entry in single_cp_items:
         cp = entry.codepoints[0]
-        glyph = cmap_table.cmap.get(cp, None)
+        glyph = cmap.get(cp, None)
         if glyph:
             _update_pua_entry(entry, glyph)
 
     # If there were multiple cmap format 12 tables correct the others
-    for cmap_table in cmap_tables[1:]:
-        cmap_table.cmap = cmap_tables[0].cmap
+    for cmap_table in font["cmap"].tables:
+        if cmap_table.format == 12:
+            cmap_table.cmap = cmap
+    if only_pua_changed:
+        # reverse_cmap skips PUA so it still holds for the next call
+        keep_cmap_index(font, index)
+    else:
+        # an identifier outside PUA was remapped in place, the cache can't tell
+        forget_cmap_index(font)
 
     result.missing = len(items_by_codepoints)
 
     return result
 
 
+def _raw_table_prefix(font: ttLib.TTFont, tag: str, size: int) -> bytes:
+    # Read just the start of a table that hasn't been loaded, not the whole thing
+    reader = font.reader
+    if reader.flavor is not None:
+        return reader[tag][:size]
+    entry = reader.tables[Tag(tag)]
+    reader.file.seek(entry.offset)
+    return reader.file.read(min(size, entry.length))
+
+
+# Header versions set on CBDT/CBLC tables that weren't loaded, written when
+# the font is saved so the tables can still be decompiled until then
+_BITMAP_HEADER_VERSIONS: "weakref.WeakKeyDictionary[ttLib.TTFont, Dict[str, int]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def _bitmap_header_version(font: ttLib.TTFont, tag: str) -> float:
+    pending = _BITMAP_HEADER_VERSIONS.get(font, {})
+    if tag in pending:
+        return pending[tag]
+    if font.isLoaded(tag):
+        return font[tag].version
+    # CBDT and CBLC both start with a Fixed version
+    (version,) = struct.unpack(">i", _raw_table_prefix(font, tag, 4))
+    return fixedToFloat(version, 16)
+
+
+def _set_bitmap_header_version(font: ttLib.TTFont, tag: str, version: int):
+    if font.isLoaded(tag):
+        font[tag].version = version
+        return
+    # Patch the bytes when saving rather than decompile and recompile every
+    # bitmap now
+    _BITMAP_HEADER_VERSIONS.setdefault(font, {})[tag] = version
+
+
+@contextlib.contextmanager
+def _bitmap_header_versions_applied(font: ttLib.TTFont):
+    # Tables still unloaded are swapped for their patched bytes while saving,
+    # then dropped so they decompile from the source again if asked for.
+    # The source stays as it was loaded: TTFont reads a font that isn't lazy
+    # into memory, and _save_font_as_is writes a lazy one alongside and
+    # replaces it, so the reader keeps the old file open.
+    swapped = []
+    try:
+        for tag, version in _BITMAP_HEADER_VERSIONS.get(font, {}).items():
+            if font.isLoaded(tag):
+                font[tag].version = version
+                continue
+            data = bytearray(font.getTableData(tag))
+            struct.pack_into(">i", data, 0, floatToFixed(version, 16))
+            table = DefaultTable(tag)
+            table.data = bytes(data)
+            font[tag] = table
+            swapped.append(tag)
+        yield
+    finally:
+        for tag in swapped:
+            del font.tables[tag]
+
+
 # Old versions of Android like API level 23 don't like CBLC or CBDT
 # to have header version 3.
 def _require_bitmap_header_version_2(font: ttLib.TTFont, will_fix: bool) -> bool:
@@ -176,18 +483,19 @@ def _require_bitmap_header_version_2(font: ttLib.TTFont, will_fix: bool) -> bool
     for tag in ("CBDT", "CBLC"):
         if tag not in font:
             continue
-        table = font[tag]
-        if table.version != 2:
-            msg = f"WARNING: {tag} is at version {table.version}. Version 2 is required"
-            if will_fix:
-                print(f"{msg}, fixing that for you...")
-            else:
-                result = False
-                print(f"{msg}, do NOT use it for emojicompat")
-                print(
-                    "         Running any emojicompat operation that saves the font will fix the problem"
-                )
-        table.version = 2
+        version = _bitmap_header_version(font, tag)
+        if version == 2:
+            continue
+        msg = f"WARNING: {tag} is at version {version}. Version 2 is required"
+        if will_fix:
+            print(f"{msg}, fixing that for you...")
+            _set_bitmap_header_version(font, tag, 2)
+        else:
+            result = False
+            print(f"{msg}, do NOT use it for emojicompat")
+            print(
+                "         Running any emojicompat operation that saves the font will fix the problem"
+            )
     return result
 
 
@@ -203,46 +511,412 @@ def _check_bitmap_size(flat_list: FlatbufferList) -> bool:
     return result
 
 
-def _run(_):
-    font_path = Path(FLAGS.font)
+def _check_bitmap_metrics(font: ttLib.TTFont, flat_list: FlatbufferList) -> bool:
+    # The bitmaps themselves against the width and height the items claim.
+    # Those are the size at the largest strike, the one EmojiCompat scales
+    # from; smaller strikes are smaller, whatever the metadata says.
+    if "CBLC" not in font or "CBDT" not in font:
+        return True
+    glyphs = bitmap_metrics.item_glyphs(font, flat_list.items)
+    glyph_ids = {g: font.getGlyphID(g) for g in glyphs.values()}
+    metrics = bitmap_metrics.font_strike_metrics(font, set(glyph_ids.values()))
+    valid = True
+    for item in flat_list.items:
+        glyph = glyphs.get(item.identifier)
+        if glyph is None:
+            continue
+        strikes = metrics.get(glyph_ids[glyph])
+        if not strikes:
+            continue
+        strike = max(strikes, key=lambda s: (s.ppem_y, s.ppem_x))
+        if (strike.width, strike.height) == (item.width, item.height):
+            continue
+        print(
+            ",".join(f"U+{c:04x}" for c in item.codepoints),
+            f"bitmap {glyph} is {strike.width}x{strike.height} at "
+            f"{strike.ppem_x}ppem; metadata says {item.width}x{item.height}",
+        )
+        valid = False
+    return valid
+
+
+_FINGERPRINT_VERSION = 2
+
+
+_FINGERPRINT_SUFFIX = ".emojicompat.json"
+
+
+def _fingerprint_file(font_path: Path) -> Path:
+    return font_path.with_name(font_path.name + _FINGERPRINT_SUFFIX)
+
+
+def _font_fingerprint(font_path: Path, op: str, source_hash: str) -> dict:
+    # Everything the result of op depends on. Only the table directory is read,
+    # its checksums cover the content of every table.
+    with open(font_path, "rb") as f:
+        header = f.read(12)
+        sfnt_version, num_tables = struct.unpack(">4sH", header[:6])
+        if sfnt_version in (b"\x00\x01\x00\x00", b"OTTO", b"true"):
+            tables = {}
+            for tag, checksum, _, length in struct.iter_unpack(
+                ">4sIII", f.read(16 * num_tables)
+            ):
+                tables[Tag(tag)] = [checksum, length]
+            content = {"tables": tables}
+        else:
+            # woff and friends, hash it all
+            f.seek(0)
+            content = {"sha1": hashlib.sha1(f.read()).hexdigest()}
+    return {
+        "version": _FINGERPRINT_VERSION,
+        "tool": emojicompat.__version__,
+        "op": op,
+        "source_hash": source_hash,
+        "metadata": emoji_compat_metadata_sha1(),
+        **content,
+    }
+
+
+def _read_fingerprint(font_path: Path) -> Optional[dict]:
+    try:
+        with open(_fingerprint_file(font_path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_fingerprint(font_path: Path, fingerprint: dict):
+    with open(_fingerprint_file(font_path), "w") as f:
+        json.dump(fingerprint, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def _load_font(font_path: Path, lazy: bool) -> ttLib.TTFont:
+    # lazy decompiles only the tables, and parts of tables, that are accessed
+    # and leaves the file open to read the rest on demand
+    return ttLib.TTFont(font_path, lazy=True if lazy else None)
+
+
+def _save_font(font: ttLib.TTFont, font_path: Path, patch: bool):
+    with _bitmap_header_versions_applied(font):
+        _save_font_as_is(font, font_path, patch)
+
+
+def _save_font_as_is(font: ttLib.TTFont, font_path: Path, patch: bool):
+    if patch and sfnt_patch.can_patch(font):
+        sfnt_patch.save_patched(font, font_path)
+        return
+    if not font.lazy:
+        font.save(font_path)
+        return
+    # a lazy font is still reading from font_path, write alongside and swap
+    fd, tmp_path = tempfile.mkstemp(prefix=font_path.name, dir=font_path.parent)
+    try:
+        shutil.copymode(font_path, tmp_path)
+        with os.fdopen(fd, "wb") as f:
+            font.save(f)
+        os.replace(tmp_path, font_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _process_font(
+    font_path: Path,
+    op: str,
+    options: ProcessOptions = ProcessOptions(),
+    compat_columns: Optional[CompatColumns] = None,
+) -> FontResult:
     assert font_path.is_file()
+    source_hash = options.source_hash
+
+    def _stage(name: str):
+        return timing.stage(name, str(font_path))
+
+    incremental = options.incremental and op in {"setup", "setup_pua"}
+    if incremental:
+        with _stage("fingerprint"):
+            fingerprint = _font_fingerprint(font_path, op, source_hash)
+        if fingerprint == _read_fingerprint(font_path):
+            print(f"{font_path} is unchanged since the last {op}, nothing to do")
+            return FontResult(font_path, True)
 
-    font = ttLib.TTFont(font_path)
-    flat_list = FlatbufferList.fromfont(font)
+    with _stage("load"):
+        font = _load_font(font_path, options.lazy)
+        flat_list = FlatbufferListView.fromfont(font)
 
     valid = True
+    result = None
+
+    if op == "dump":
+        with _stage("dump"):
+            _dump(flat_list, options.dump_format, options.dump_filter, font_path)
+        # keep the dump parseable, the problems found go to stderr
+        report = (
+            contextlib.redirect_stdout(sys.stderr)
+            if _machine_readable(op, options)
+            else contextlib.nullcontext()
+        )
+        with _stage("bitmap_checks"), report:
+            valid = _require_bitmap_header_version_2(font, False) and valid
+            valid = _check_bitmap_size(flat_list) and valid
+        with _stage("bitmap_metrics"), report:
+            valid = _check_bitmap_metrics(font, flat_list) and valid
+    elif op in {"setup", "setup_pua", "check"}:
+        if op == "check":
+            with _stage("check_source_sha"):
+                valid = _check_source_sha(font, flat_list) and valid
+        pua_list = flat_list
+        if op == "setup":
+            with _stage("compat_metadata"):
+                if compat_columns is None:
+                    compat_columns = emoji_compat_metadata_columns()
+                flat_compat = FlatbufferList.from_compat_columns(compat_columns, "")
+            pua_list = flat_compat
+            if source_hash == "font":
+                # hash of the font as we found it
+                with _stage("source_sha"):
+                    flat_compat = flat_compat._replace(
+                        source_sha=_hash_of_font_without_compat_data(font)
+                    )
+                with _stage("setup_meta"):
+                    flat_list = _update_meta(font, flat_list, flat_compat)
+        with _stage("setup_pua"):
+            result = _setup_pua(font, pua_list)
+        result.print()
+        with _stage("bitmap_header"):
+            valid = _require_bitmap_header_version_2(font, op != "check") and valid
+        if op == "setup" and source_hash == "tables":
+            # hash of the font as we are about to save it, so check can verify it
+            with _stage("source_sha"):
+                flat_compat = flat_compat._replace(
+                    source_sha=_TABLES_HASH_PREFIX
+                    + _hash_of_tables_without_compat_data(font)
+                )
+            with _stage("setup_meta"):
+                flat_list = _update_meta(font, flat_list, flat_compat)
+        with _stage("bitmap_size"):
+            valid = _check_bitmap_size(flat_list) and valid
+        with _stage("bitmap_metrics"):
+            valid = _check_bitmap_metrics(font, flat_list) and valid
+        if op != "check":
+            print(f"Updating {font_path}")
+            with _stage("save"):
+                _save_font(font, font_path, options.patch)
+    font.close()
+
+    if incremental and valid:
+        # of the font as we left it, so the next run finds nothing to do
+        _write_fingerprint(font_path, _font_fingerprint(font_path, op, source_hash))
+
+    return FontResult(font_path, valid, result)
+
+
+# Set once per worker process so the metadata is pickled once per worker, not per font
+_WORKER_COMPAT_COLUMNS: Optional[CompatColumns] = None
+
+
+def _init_worker(compat_columns: Optional[CompatColumns]):
+    global _WORKER_COMPAT_COLUMNS
+    _WORKER_COMPAT_COLUMNS = compat_columns
+
+
+def _process_font_captured(
+    font_path: Path,
+    op: str,
+    options: ProcessOptions,
+    compat_columns: Optional[CompatColumns] = None,
+) -> FontResult:
+    if compat_columns is None:
+        compat_columns = _WORKER_COMPAT_COLUMNS
+    output = io.StringIO()
+    stages = io.StringIO()
+    with contextlib.redirect_stdout(output), _maybe_print_stages(
+        options.profile, stages
+    ):
+        try:
+            result = _process_font(font_path, op, options, compat_columns)
+        except Exception as e:
+            # one bad font shouldn't take the rest of the batch down with it
+            print(
+                f"ERROR: {type(e).__name__}: {e}",
+                file=sys.stderr if _machine_readable(op, options) else sys.stdout,
+            )
+            result = FontResult(font_path, False)
+    result.output = output.getvalue()
+    result.stages = stages.getvalue()
+    return result
 
-    if FLAGS.op == "dump":
-        _dump(flat_list)
-        valid = _require_bitmap_header_version_2(font, False) and valid
-        valid = _check_bitmap_size(flat_list) and valid
-    elif FLAGS.op in {"setup", "setup_pua", "check"}:
-        if FLAGS.op == "setup":
-            flat_compat = FlatbufferList.from_compat_entries(
-                emoji_compat_metadata(), _hash_of_font_without_compat_data(font)
+
+def process_fonts(
+    font_paths: Sequence[Path],
+    op: str,
+    options: ProcessOptions = ProcessOptions(),
+    jobs: int = 1,
+) -> List[FontResult]:
+    """Run op over many fonts, in order, parsing the compat metadata once.
+
+    With options.profile each font's stage timings are kept, as JSON lines, in
+    its result's stages."""
+    compat_columns = emoji_compat_metadata_columns() if op == "setup" else None
+    if jobs <= 1 or len(font_paths) <= 1:
+        return [
+            _process_font_captured(p, op, options, compat_columns) for p in font_paths
+        ]
+    # multiprocessing is slow to import and most runs are a single font
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(
+        max_workers=jobs, initializer=_init_worker, initargs=(compat_columns,)
+    ) as executor:
+        return list(
+            executor.map(
+                _process_font_captured,
+                font_paths,
+                [op] * len(font_paths),
+                [options] * len(font_paths),
             )
-            if flat_compat != flat_list:
-                print("Updating 'meta'")
-                flat_list = flat_compat
-                _setup_meta(font, flat_list)
+        )
+
+
+def _diff_fonts(before_path: Path, after_path: Path) -> diff.MetadataDiff:
+    fonts = [_load_font(p, True) for p in (before_path, after_path)]
+    try:
+        return diff.diff(*(FlatbufferListView.fromfont(f) for f in fonts))
+    finally:
+        for font in fonts:
+            font.close()
+
+
+def _maybe_print_stages(profile: bool, out: Optional[TextIO] = None):
+    return timing.print_stages(out) if profile else contextlib.nullcontext()
+
+
+def _machine_readable(op: str, options: ProcessOptions) -> bool:
+    # stdout is the dump, anything else printed has to go elsewhere
+    return op == "dump" and options.dump_format != "text"
+
+
+def _expand_fonts(patterns: Iterable[str], unique: bool = True) -> List[Path]:
+    font_paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True))
+        if not matches:
+            if not glob.has_magic(pattern):
+                matches = [pattern]  # let the missing file be reported later
             else:
-                print("'meta' is already correct")
-        result = _setup_pua(font, flat_list)
-        result.print()
-        valid = _require_bitmap_header_version_2(font, FLAGS.op != "check") and valid
-        valid = _check_bitmap_size(flat_list) and valid
-        if FLAGS.op != "check":
-            print(f"Updating {font_path}")
-            font.save(font_path)
+                raise app.UsageError(f"{pattern} doesn't match any font")
+        if glob.has_magic(pattern):
+            # --incremental leaves its fingerprints beside the fonts
+            matches = [m for m in matches if not m.endswith(_FINGERPRINT_SUFFIX)]
+        font_paths.extend(Path(m) for m in matches)
+    if not unique:
+        return font_paths
+    # the same font twice in a batch would race with itself
+    return list(dict.fromkeys(font_paths))
+
+
+def _font_patterns() -> List[str]:
+    patterns = list(FLAGS.font or [])
+    if FLAGS.fonts_from:
+        with open(FLAGS.fonts_from) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    patterns.append(line)
+    return patterns
+
+
+def _dump_filter_from_flags() -> dump.DumpFilter:
+    def int_range(
+        flag: str,
+        parse: Callable[[str], dump.IntRange] = dump.IntRange.fromstring,
+        example: str = "3-7",
+    ) -> Optional[dump.IntRange]:
+        value = FLAGS[flag].value
+        if value is None:
+            return None
+        try:
+            return parse(value)
+        except ValueError:
+            raise app.UsageError(f"--{flag}={value} isn't a range like {example}")
+
+    codepoint = None
+    if FLAGS.dump_codepoint is not None:
+        try:
+            codepoint = dump.parse_codepoint(FLAGS.dump_codepoint)
+        except ValueError:
+            raise app.UsageError(f"--dump_codepoint={FLAGS.dump_codepoint} isn't hex")
+    return dump.DumpFilter(
+        int_range("dump_identifiers", dump.parse_codepoint_range, "F0000-F00FF"),
+        codepoint,
+        int_range("dump_sdk_added"),
+        int_range("dump_compat_added"),
+        FLAGS.dump_emoji_style,
+    )
 
-    if not valid:
+
+def _run(_):
+    # diff compares its two fonts as given, even if they are the same one
+    font_paths = _expand_fonts(_font_patterns(), unique=FLAGS.op != "diff")
+    if FLAGS.op == "dump" and FLAGS.dump_format == "binary" and len(font_paths) > 1:
+        raise app.UsageError("--dump_format=binary dumps one font at a time")
+    if FLAGS.op == "diff":
+        if len(font_paths) != 2:
+            raise app.UsageError("--op diff takes two fonts, before and after")
+        for font_path in font_paths:
+            assert font_path.is_file()
+        metadata_diff = _diff_fonts(*font_paths)
+        print(f"--- {font_paths[0]}")
+        print(f"+++ {font_paths[1]}")
+        for line in metadata_diff.lines():
+            print(line)
+        sys.exit(1 if metadata_diff else 0)
+
+    options = ProcessOptions.fromflags()
+    if len(font_paths) == 1:
+        # just the one, print as we go
+        with _maybe_print_stages(options.profile):
+            results = [_process_font(font_paths[0], FLAGS.op, options)]
+    else:
+        results = process_fonts(font_paths, FLAGS.op, options, FLAGS.jobs)
+        log = sys.stderr if _machine_readable(FLAGS.op, options) else sys.stdout
+        # one csv header row for the lot, every row names its font anyway
+        csv = FLAGS.op == "dump" and options.dump_format == "csv"
+        csv_header_written = False
+        for result in results:
+            print(f"== {result.font}", file=log)
+            output = result.output
+            if csv and output.startswith(dump.CSV_HEADER):
+                if csv_header_written:
+                    output = output[len(dump.CSV_HEADER) :]
+                csv_header_written = True
+            sys.stdout.write(output)
+            sys.stdout.flush()
+            sys.stderr.write(result.stages)
+        print(f"{sum(r.valid for r in results)}/{len(results)} fonts valid", file=log)
+        for result in results:
+            if not result.valid:
+                print(f"INVALID {result.font}", file=log)
+
+    if not all(r.valid for r in results):
         sys.exit(1)
 
 
+def _require_fonts():
+    # Only when run as a tool, so importing this module doesn't impose our flags
+    flags.register_multi_flags_validator(
+        ["font", "fonts_from"],
+        lambda f: f["font"] or f["fonts_from"],
+        message="--font or --fonts_from is required",
+    )
+
+
 def main():
     # We don't seem to be __main__ when run as cli tool installed by setuptools
+    _require_fonts()
     app.run(_run)
 
 
 if __name__ == "__main__":
-    app.run(_run)
+    main()
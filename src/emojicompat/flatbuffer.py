@@ -12,19 +12,34 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from array import array
+import dataclasses
 import flatbuffers
+import functools
+import hashlib
+import itertools
 from fontTools import ttLib
-from nototools.unicode_data import is_regional_indicator, get_presentation_default_emoji
 from pathlib import Path
-from typing import NamedTuple, Tuple
-from emojicompat.compat_metadata import CompatEntry
+import struct
+from typing import (
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+from emojicompat.compat_metadata import CompatColumns, CompatEntry
+from emojicompat import flatbuffer_codec
 
 from androidx.text.emoji.flatbuffer.MetadataItem import *
 from androidx.text.emoji.flatbuffer.MetadataList import *
 
 
 # Forced a few extras to emoji style to match behavior of implementation we are replacing
-_EMOJI_STYLE = {
+_EMOJI_STYLE_EXTRAS = {
     0x270C,
     0x2600,
     0x2601,
@@ -37,13 +52,41 @@ _EMOJI_STYLE = {
     0x2666,
     0x2744,
     0x2764,
-} | get_presentation_default_emoji()
+}
+
+_MAX_CODEPOINT = 0x10FFFF
+
+
+@functools.lru_cache(maxsize=None)
+def _emoji_style_bits() -> bytes:
+    # One bit per codepoint, ~136KB, built once and shared by every lookup.
+    # nototools is only imported here, ops that never classify don't load it.
+    from nototools.unicode_data import get_presentation_default_emoji
+
+    bits = bytearray((_MAX_CODEPOINT >> 3) + 1)
+    for cp in _EMOJI_STYLE_EXTRAS | get_presentation_default_emoji():
+        bits[cp >> 3] |= 1 << (cp & 7)
+    return bytes(bits)
 
 
 def _is_emoji_style(codepoints: Tuple[int, ...]) -> bool:
     if len(codepoints) != 1:
         return False
-    return codepoints[0] in _EMOJI_STYLE
+    cp = codepoints[0]
+    return 0 <= cp <= _MAX_CODEPOINT and bool(
+        _emoji_style_bits()[cp >> 3] & (1 << (cp & 7))
+    )
+
+
+def _emoji_styles(codepoints: Iterable[Tuple[int, ...]]) -> List[bool]:
+    # _is_emoji_style over many sequences, with the lookups hoisted
+    bits = _emoji_style_bits()
+    return [
+        len(cps) == 1
+        and 0 <= cps[0] <= _MAX_CODEPOINT
+        and bool(bits[cps[0] >> 3] & (1 << (cps[0] & 7)))
+        for cps in codepoints
+    ]
 
 
 # All the fields of the flatbuffer item
@@ -80,7 +123,6 @@ class FlatbufferItem(NamedTuple):
     def from_compat_entry(cls, entry: CompatEntry) -> "FlatbufferItem":
         # w/h is only useful for CBDT and in CBDT should always be 136x128
         width, height = 136, 128
-        present_as_emoji = get_presentation_default_emoji()
 
         return cls(
             entry.identifier,
@@ -96,13 +138,25 @@ class FlatbufferItem(NamedTuple):
 # All the fields of the flatbuffer list
 class FlatbufferList(NamedTuple):
     version: int
-    items: Tuple[FlatbufferItem, ...]
-    source_sha: str
+    items: Sequence[FlatbufferItem]
+    # bytes, or None if absent, when read from a flatbuffer
+    source_sha: Optional[Union[str, bytes]]
 
     def compat_entries(self) -> Tuple[CompatEntry, ...]:
         return tuple(e.compat_entry() for e in self.items)
 
-    def toflatbytes(self) -> bytearray:
+    def toflatbytes(self, use_builder: bool = False) -> bytearray:
+        # Lays the buffer out directly; identical bytes to the Builder path
+        if not use_builder and isinstance(self.items, _ColumnItems):
+            columns = self.items.columns
+            return flatbuffer_codec.encode_metadata_columns(
+                max(columns.compat_added), columns, self.source_sha
+            )
+        if not use_builder:
+            return flatbuffer_codec.encode_metadata_list(
+                max(e.compat_added for e in self.items), self.items, self.source_sha
+            )
+
         # See https://google.github.io/flatbuffers/flatbuffers_guide_tutorial.html
         builder = flatbuffers.Builder(65536)
 
@@ -155,7 +209,28 @@ class FlatbufferList(NamedTuple):
         )
 
     @classmethod
-    def fromflatbytes(cls, flat: bytes) -> "FlatbufferList":
+    def fromcolumns(
+        cls,
+        version: int,
+        columns: CompatColumns,
+        source_sha: Optional[Union[str, bytes]],
+    ) -> "FlatbufferList":
+        # items are made from the columns as they are accessed, not kept
+        return cls(version, _ColumnItems(columns), source_sha)
+
+    @classmethod
+    def fromflatbytes(
+        cls, flat: bytes, bulk: bool = False, columnar: bool = False
+    ) -> "FlatbufferList":
+        # bulk skips the generated accessors and decodes every column in one
+        # pass, columnar also keeps it that way
+        if bulk or columnar:
+            version, columns, source_sha = flatbuffer_codec.decode_metadata_list(flat)
+            if columnar:
+                return cls.fromcolumns(version, columns, source_sha)
+            return cls(
+                version, tuple(map(FlatbufferItem._make, columns.rows())), source_sha
+            )
         return cls.fromflat(MetadataList.GetRootAsMetadataList(bytearray(flat), 0))
 
     @classmethod
@@ -173,8 +248,251 @@ class FlatbufferList(NamedTuple):
     def from_compat_entries(
         cls, entries: Tuple[CompatEntry, ...], source_sha: str
     ) -> "FlatbufferList":
-        return cls(
-            max(e.compat_added for e in entries),
-            tuple(FlatbufferItem.from_compat_entry(e) for e in entries),
+        # from_compat_entry for all the entries at once
+        identifiers, sdk_added, compat_added, codepoints = zip(*entries)
+        items = tuple(
+            map(
+                FlatbufferItem._make,
+                zip(
+                    identifiers,
+                    _emoji_styles(codepoints),
+                    sdk_added,
+                    compat_added,
+                    itertools.repeat(136),
+                    itertools.repeat(128),
+                    codepoints,
+                ),
+            )
+        )
+        return cls(max(compat_added), items, source_sha)
+
+    @classmethod
+    def from_compat_columns(
+        cls, columns: CompatColumns, source_sha: str
+    ) -> "FlatbufferList":
+        # shares all but the item only columns with the input
+        width, height = 136, 128
+        num_items = len(columns)
+        offsets = columns.offsets
+        codepoints = columns.codepoints
+        bits = _emoji_style_bits()
+        emoji_style = array("i", [0]) * num_items
+        for i in range(num_items):
+            start = offsets[i]
+            if offsets[i + 1] - start == 1:
+                cp = codepoints[start]
+                if 0 <= cp <= _MAX_CODEPOINT and bits[cp >> 3] & (1 << (cp & 7)):
+                    emoji_style[i] = 1
+        return cls.fromcolumns(
+            max(columns.compat_added),
+            dataclasses.replace(
+                columns,
+                emoji_style=emoji_style,
+                width=array("i", [width]) * num_items,
+                height=array("i", [height]) * num_items,
+            ),
             source_sha,
         )
+
+    def tocolumns(self) -> CompatColumns:
+        if isinstance(self.items, _ColumnItems):
+            return self.items.columns.copy()
+        return CompatColumns.from_rows(self.items)
+
+    def digest(self) -> bytes:
+        """sha1 of version, source_sha and the items as columns.
+
+        Cached for lists made from columns, the hash of those is kept with
+        the items; a list of item tuples is hashed on every call."""
+        digest = hashlib.sha1(b"columns")
+        digest.update(struct.pack("<i", self.version))
+        sha = source_sha_bytes(self.source_sha)
+        digest.update(struct.pack("<I", len(sha)) + sha)
+        if isinstance(self.items, _ColumnItems):
+            if self.items.digest is None:
+                self.items.digest = _columns_digest(self.items.columns)
+            digest.update(self.items.digest)
+        else:
+            digest.update(_columns_digest(CompatColumns.from_rows(self.items)))
+        return digest.digest()
+
+
+def source_sha_bytes(source_sha: Optional[Union[str, bytes]]) -> bytes:
+    """source_sha as bytes, whether a list has it as str, bytes or None."""
+    if source_sha is None:
+        return b""
+    if isinstance(source_sha, str):
+        return source_sha.encode("utf-8")
+    return bytes(source_sha)
+
+
+def _columns_digest(columns: CompatColumns) -> bytes:
+    digest = hashlib.sha1()
+    for field in dataclasses.fields(columns):
+        values = getattr(columns, field.name)
+        digest.update(struct.pack("<I", len(values)))
+        digest.update(values.tobytes())
+    return digest.digest()
+
+
+class _ColumnItems(Sequence[FlatbufferItem]):
+    """FlatbufferItems made from CompatColumns on access."""
+
+    def __init__(self, columns: CompatColumns):
+        self.columns = columns
+        # of columns, filled in by FlatbufferList.digest
+        self.digest: Optional[bytes] = None
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return FlatbufferItem._make(self.columns.row(index))
+
+    def __iter__(self) -> Iterator[FlatbufferItem]:
+        return map(FlatbufferItem._make, self.columns.rows())
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"<{len(self)} items>"
+
+
+def _meta_entry(font: ttLib.TTFont, tag: str) -> Optional[memoryview]:
+    # Prefer the raw table so we don't decompile 'meta' (and copy every entry)
+    # just to look at one of them
+    if "meta" not in font:
+        return None
+    if font.isLoaded("meta") or font.reader is None or "meta" not in font.reader:
+        data = font["meta"].data.get(tag, None)
+        return memoryview(data) if data is not None else None
+
+    # https://docs.microsoft.com/en-us/typography/opentype/spec/meta
+    meta: bytes = font.reader["meta"]
+    (data_maps_count,) = struct.unpack_from(">I", meta, 12)
+    for i in range(data_maps_count):
+        entry_tag, offset, length = struct.unpack_from(">4sII", meta, 16 + 12 * i)
+        if entry_tag == tag.encode("ascii"):
+            return memoryview(meta)[offset : offset + length]
+    return None
+
+
+class _LazyItems(Sequence[FlatbufferItem]):
+    """The items of a MetadataList, decoded on first access."""
+
+    def __init__(self, flat: MetadataList):
+        self._flat = flat
+        self._items: List[Optional[FlatbufferItem]] = [None] * flat.ListLength()
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return tuple(self[i] for i in range(*index.indices(len(self))))
+        item = self._items[index]
+        if item is None:
+            item = FlatbufferItem.fromflat(self._flat.List(index % len(self)))
+            self._items[index] = item
+        return item
+
+    def __iter__(self) -> Iterator[FlatbufferItem]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    __hash__ = None  # type: ignore
+
+    def decoded_count(self) -> int:
+        return sum(1 for i in self._items if i is not None)
+
+
+class FlatbufferListView:
+    """Read-only view of a MetadataList that decodes items on demand.
+
+    Reading version or source_sha never touches the items. Compares equal
+    to a FlatbufferList with the same content."""
+
+    def __init__(self, flat: bytes):
+        self._buf: Union[bytes, memoryview] = memoryview(flat)
+        self._flat = MetadataList.GetRootAsMetadataList(self._buf, 0)
+        self._items = _LazyItems(self._flat)
+        self._source_sha: Optional[bytes] = None
+        self._digest: Optional[bytes] = None
+
+    @property
+    def version(self) -> int:
+        return self._flat.Version()
+
+    @property
+    def source_sha(self) -> bytes:
+        # same type FlatbufferList.fromflat produces, so the two compare equal
+        if self._source_sha is None:
+            self._source_sha = self._flat.SourceSha()
+        return self._source_sha
+
+    @property
+    def items(self) -> _LazyItems:
+        return self._items
+
+    def compat_entries(self) -> Tuple[CompatEntry, ...]:
+        return tuple(e.compat_entry() for e in self.items)
+
+    def digest(self) -> bytes:
+        """sha1 of the flatbuffer, so identical lists are found without decoding."""
+        if self._digest is None:
+            self._digest = hashlib.sha1(self._buf).digest()
+        return self._digest
+
+    def tocolumns(self) -> CompatColumns:
+        # every item at once, straight from the buffer
+        return flatbuffer_codec.decode_metadata_list(self._buf)[1]
+
+    def toflatbytes(self) -> bytearray:
+        return self.materialize().toflatbytes()
+
+    def materialize(self) -> FlatbufferList:
+        return FlatbufferList(self.version, tuple(self.items), self.source_sha)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, (FlatbufferList, FlatbufferListView)):
+            return NotImplemented
+        # cheap fields first so a changed sha never decodes the items
+        return (
+            self.version == other.version
+            and self.source_sha == other.source_sha
+            and self.items == other.items
+        )
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        return f"FlatbufferListView(version={self.version}, items=<{len(self.items)} items>, source_sha={self.source_sha!r})"
+
+    @classmethod
+    def fromflatbytes(cls, flat: bytes) -> "FlatbufferListView":
+        return cls(flat)
+
+    @classmethod
+    def fromfont(
+        cls, font: ttLib.TTFont
+    ) -> Union["FlatbufferListView", FlatbufferList]:
+        emoji_metadata = _meta_entry(font, "Emji")
+        if emoji_metadata is None:
+            return FlatbufferList.empty()
+        return cls(emoji_metadata)
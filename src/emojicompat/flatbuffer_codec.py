@@ -0,0 +1,317 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Direct struct-based codec for the emoji_metadata.fbs schema.
+
+The generated accessors in androidx.text.emoji.flatbuffer go through the
+flatbuffers Table machinery for every field of every item. The schema is
+tiny and fixed so here we walk the layout ourselves, see
+https://flatbuffers.dev/internals/ for the format.
+"""
+
+from emojicompat.compat_metadata import CompatColumns
+import struct
+import sys
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+
+# what struct.unpack_from reads from
+_Buffer = Union[bytes, bytearray, memoryview]
+
+_UOFFSET = struct.Struct("<I")
+_SOFFSET = struct.Struct("<i")
+_VTABLE_HEADER = struct.Struct("<HH")
+_INT32 = struct.Struct("<i")
+_BOOL = struct.Struct("<?")
+_INT16 = struct.Struct("<h")
+
+
+# (struct format, default) for each field of MetadataItem, in schema order.
+# codepoints is an offset to a vector and has no default.
+_ITEM_FIELDS = (
+    ("i", 0),  # id
+    ("?", False),  # emojiStyle
+    ("h", 0),  # sdkAdded
+    ("h", 0),  # compatAdded
+    ("h", 0),  # width
+    ("h", 0),  # height
+    ("I", None),  # codepoints
+)
+_CODEPOINTS_FIELD = 6
+
+
+# MetadataList, in schema order
+_LIST_FIELDS = (
+    ("i", 0),  # version
+    ("I", None),  # list
+    ("I", None),  # sourceSha
+)
+
+
+class _TableLayout(NamedTuple):
+    # unpacks every field present in the vtable in one call, from the table start
+    unpacker: struct.Struct
+    # for each schema field the index into the unpacked values, or None if absent
+    value_index: Tuple[Optional[int], ...]
+    # for each schema field the offset from the table start, or 0 if absent
+    field_offset: Tuple[int, ...]
+
+
+def _table_layout(
+    buf: _Buffer, vtable: int, fields: Tuple[Tuple[str, object], ...]
+) -> _TableLayout:
+    vtable_size, _ = _VTABLE_HEADER.unpack_from(buf, vtable)
+    num_slots = min(len(fields), (vtable_size - _VTABLE_HEADER.size) // 2)
+    field_offset = [0] * len(fields)
+    if num_slots:
+        field_offset[:num_slots] = struct.unpack_from(
+            f"<{num_slots}H", buf, vtable + _VTABLE_HEADER.size
+        )
+
+    present = sorted((off, i) for i, off in enumerate(field_offset) if off)
+    fmt = ["<"]
+    value_index: List[Optional[int]] = [None] * len(fields)
+    cursor = 0
+    for value_idx, (off, i) in enumerate(present):
+        code = fields[i][0]
+        fmt.append("x" * (off - cursor) + code)
+        cursor = off + struct.calcsize("<" + code)
+        value_index[i] = value_idx
+    return _TableLayout(
+        struct.Struct("".join(fmt)), tuple(value_index), tuple(field_offset)
+    )
+
+
+def _read_table(
+    buf: _Buffer,
+    pos: int,
+    fields: Tuple[Tuple[str, object], ...],
+    layouts: Dict[int, _TableLayout],
+) -> Tuple[_TableLayout, List]:
+    vtable = pos - _SOFFSET.unpack_from(buf, pos)[0]
+    layout = layouts.get(vtable)
+    if layout is None:
+        layout = layouts[vtable] = _table_layout(buf, vtable, fields)
+    values = layout.unpacker.unpack_from(buf, pos)
+    return layout, [
+        values[idx] if idx is not None else default
+        for idx, (_, default) in zip(layout.value_index, fields)
+    ]
+
+
+def _read_vector_len(buf: _Buffer, field_pos: int) -> Tuple[int, int]:
+    vector = field_pos + _UOFFSET.unpack_from(buf, field_pos)[0]
+    return vector + _UOFFSET.size, _UOFFSET.unpack_from(buf, vector)[0]
+
+
+def decode_metadata_list(
+    buf: _Buffer,
+) -> Tuple[int, CompatColumns, Optional[bytes]]:
+    """Decode an Emji flatbuffer into (version, columns, source_sha).
+
+    Produces the same values as the generated accessors, source_sha is bytes
+    (or None if absent) just like MetadataList.SourceSha."""
+    root = _UOFFSET.unpack_from(buf, 0)[0]
+    layout, (version, _, _) = _read_table(buf, root, _LIST_FIELDS, {})
+
+    source_sha = None
+    if layout.field_offset[2]:
+        start, length = _read_vector_len(buf, root + layout.field_offset[2])
+        source_sha = bytes(buf[start : start + length])
+
+    columns = CompatColumns.empty()
+    if not layout.field_offset[1]:
+        return version, columns, source_sha
+
+    items_start, num_items = _read_vector_len(buf, root + layout.field_offset[1])
+    item_offsets = struct.unpack_from(f"<{num_items}I", buf, items_start)
+
+    # vtables are deduplicated by the builder so there are only a handful
+    layouts: Dict[int, _TableLayout] = {}
+    appends = [
+        columns.identifier.append,
+        columns.emoji_style.append,
+        columns.sdk_added.append,
+        columns.compat_added.append,
+        columns.width.append,
+        columns.height.append,
+    ]
+    codepoints = columns.codepoints
+    append_offset = columns.offsets.append
+    for i, item_offset in enumerate(item_offsets):
+        pos = items_start + 4 * i + item_offset
+        layout, values = _read_table(buf, pos, _ITEM_FIELDS, layouts)
+        for append, value in zip(appends, values):
+            append(value)
+
+        cp_field = layout.field_offset[_CODEPOINTS_FIELD]
+        if cp_field:
+            start, length = _read_vector_len(buf, pos + cp_field)
+            codepoints.frombytes(buf[start : start + 4 * length])
+        append_offset(len(codepoints))
+
+    if sys.byteorder != "little":
+        codepoints.byteswap()
+    return version, columns, source_sha
+
+
+def _align(offset: int, size: int, additional: int = 0) -> int:
+    # Builder.Prep: pad so `size` is aligned once `additional` bytes follow
+    return offset + ((-(offset + additional)) & (size - 1))
+
+
+class _BackToFrontWriter:
+    """Mirrors the offset arithmetic of flatbuffers.Builder over a buffer
+    sized up front. Offsets count from the end of the buffer, as in Builder."""
+
+    def __init__(self, size: int):
+        self.buf = bytearray(size)
+        self.size = size
+        self.offset = 0
+        self.vtables: Dict[Tuple[int, ...], int] = {}
+
+    def prepend(self, packer: struct.Struct, value) -> int:
+        offset = _align(self.offset, packer.size) + packer.size
+        packer.pack_into(self.buf, self.size - offset, value)
+        self.offset = offset
+        return offset
+
+    def prepend_uoffset(self, target: int) -> int:
+        offset = _align(self.offset, _UOFFSET.size) + _UOFFSET.size
+        _UOFFSET.pack_into(self.buf, self.size - offset, offset - target)
+        self.offset = offset
+        return offset
+
+    def end_table(self, object_end: int, slots: List[int]) -> int:
+        # Builder.WriteVtable, including its vtable deduplication
+        object_offset = self.prepend(_SOFFSET, 0)
+
+        num_slots = len(slots)
+        while num_slots and not slots[num_slots - 1]:
+            num_slots -= 1
+        field_offsets = [object_offset - s if s else 0 for s in slots[:num_slots]]
+        object_size = object_offset - object_end
+        key = tuple(reversed(field_offsets)) + (object_size,)
+
+        vtable = self.vtables.get(key)
+        if vtable is None:
+            vtable_size = 2 * (num_slots + 2)
+            vtable = self.offset + vtable_size
+            struct.pack_into(
+                f"<{num_slots + 2}H",
+                self.buf,
+                self.size - vtable,
+                vtable_size,
+                object_size,
+                *field_offsets,
+            )
+            self.offset = vtable
+            self.vtables[key] = vtable
+        _SOFFSET.pack_into(self.buf, self.size - object_offset, vtable - object_offset)
+        return object_offset
+
+    def output(self) -> bytearray:
+        return self.buf[self.size - self.offset :]
+
+
+def encode_metadata_list(
+    version: int,
+    items: Sequence[Tuple[int, bool, int, int, int, int, Sequence[int]]],
+    source_sha,
+) -> bytearray:
+    """Encode rows of (identifier, emoji_style, sdk_added, compat_added, width,
+    height, codepoints) into the same bytes flatbuffers.Builder produces."""
+    num_codepoints = sum(len(item[_CODEPOINTS_FIELD]) for item in items)
+    return _encode(version, items, len(items), num_codepoints, source_sha)
+
+
+def encode_metadata_columns(
+    version: int, columns: CompatColumns, source_sha
+) -> bytearray:
+    """As encode_metadata_list, straight from columns."""
+    return _encode(
+        version, columns.rows(), len(columns), len(columns.codepoints), source_sha
+    )
+
+
+def _encode(
+    version: int,
+    rows: Iterable[Tuple[int, bool, int, int, int, int, Sequence[int]]],
+    num_items: int,
+    num_codepoints: int,
+    source_sha,
+) -> bytearray:
+    if isinstance(source_sha, str):
+        source_sha = source_sha.encode("utf-8")
+    source_sha = bytes(source_sha)
+
+    # every item needs at most 60 bytes + its codepoints, padding included
+    size = 64 * (num_items + 1) + len(source_sha) + 4 * num_codepoints
+    writer = _BackToFrontWriter(size)
+    buf = writer.buf
+
+    item_offsets = []
+    for identifier, emoji_style, sdk_added, compat_added, width, height, cps in rows:
+        # codepoint vector: Prep(4, 4 * n) then the values then the length
+        num_cps = len(cps)
+        offset = _align(writer.offset, 4, 4 * num_cps) + 4 * num_cps
+        struct.pack_into(f"<{num_cps}i", buf, size - offset, *cps)
+        writer.offset = offset + 4
+        _UOFFSET.pack_into(buf, size - writer.offset, num_cps)
+        codepoint_vec = writer.offset
+
+        object_end = writer.offset
+        slots = [0] * len(_ITEM_FIELDS)
+        if identifier != 0:
+            slots[0] = writer.prepend(_INT32, identifier)
+        if emoji_style != 0:
+            slots[1] = writer.prepend(_BOOL, emoji_style)
+        for slot, value in ((2, sdk_added), (3, compat_added), (4, width), (5, height)):
+            if value != 0:
+                slots[slot] = writer.prepend(_INT16, value)
+        slots[_CODEPOINTS_FIELD] = writer.prepend_uoffset(codepoint_vec)
+        item_offsets.append(writer.end_table(object_end, slots))
+
+    # vector of item offsets
+    writer.offset = _align(writer.offset, 4, 4 * len(item_offsets))
+    for item_offset in reversed(item_offsets):
+        writer.prepend_uoffset(item_offset)
+    item_vec = writer.prepend(_UOFFSET, len(item_offsets))
+
+    # null terminated string
+    writer.offset = _align(writer.offset, 4, len(source_sha) + 1) + len(source_sha) + 1
+    buf[size - writer.offset : size - writer.offset + len(source_sha)] = source_sha
+    sha = writer.prepend(_UOFFSET, len(source_sha))
+
+    object_end = writer.offset
+    slots = [0] * len(_LIST_FIELDS)
+    if version != 0:
+        slots[0] = writer.prepend(_INT32, version)
+    slots[1] = writer.prepend_uoffset(item_vec)
+    slots[2] = writer.prepend_uoffset(sha)
+    root = writer.end_table(object_end, slots)
+
+    # Builder.Finish, minalign is always 4 for this schema
+    writer.offset = _align(writer.offset, 4, 4)
+    writer.prepend_uoffset(root)
+    return writer.output()
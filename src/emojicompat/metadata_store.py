@@ -0,0 +1,187 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Edit emoji_metadata.txt in memory and write it back in one go.
+
+Entries are indexed by identifier and by codepoint sequence, so every
+insert, update or delete is checked against the rest in constant time.
+Changes made inside transaction() are undone if it raises. save() writes
+the text in canonical order, sorted by identifier, and the binary sidecar
+straight from memory, each atomically.
+"""
+
+import contextlib
+from emojicompat import compat_metadata
+from emojicompat.compat_metadata import CompatColumns, CompatEntry
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+_HEADER = "#id sdkAdded compatAdded codepoints\n"
+
+
+def format_entry(entry: CompatEntry) -> str:
+    """entry as a line of emoji_metadata.txt, without the newline."""
+    codepoints = " ".join(f"{c:X}" for c in entry.codepoints)
+    return f"{entry.identifier:X} {entry.sdk_added} {entry.compat_added} {codepoints}"
+
+
+class MetadataStore:
+    """Compat entries with unique identifiers and unique codepoint sequences.
+
+    Violations raise ValueError and leave the store as it was."""
+
+    def __init__(self, entries: Iterable[CompatEntry] = ()):
+        self._by_identifier: Dict[int, CompatEntry] = {}
+        self._by_codepoints: Dict[Tuple[int, ...], CompatEntry] = {}
+        # (before, after) of each change in the open transaction
+        self._undo: Optional[
+            List[Tuple[Optional[CompatEntry], Optional[CompatEntry]]]
+        ] = None
+        for entry in entries:
+            self._check_new(entry)
+            self._put(entry)
+
+    @classmethod
+    def load(
+        cls, text_file: Optional[Path] = None, sidecar_file: Optional[Path] = None
+    ) -> "MetadataStore":
+        """From emoji_metadata.txt, through its sidecar if it is current, by
+        default. Raises ValueError on duplicate identifiers or sequences."""
+        if text_file is None:
+            text_file = compat_metadata.emoji_metadata_file()
+            sidecar_file = compat_metadata.emoji_metadata_sidecar_file()
+        columns = compat_metadata.load_emoji_metadata_columns(text_file, sidecar_file)
+        return cls(columns.compat_entries())
+
+    def __len__(self) -> int:
+        return len(self._by_identifier)
+
+    def __iter__(self) -> Iterator[CompatEntry]:
+        """In canonical order, by identifier."""
+        return (self._by_identifier[i] for i in sorted(self._by_identifier))
+
+    def __contains__(self, identifier: int) -> bool:
+        return identifier in self._by_identifier
+
+    def get(self, identifier: int) -> Optional[CompatEntry]:
+        return self._by_identifier.get(identifier)
+
+    def find(self, codepoints: Tuple[int, ...]) -> Optional[CompatEntry]:
+        return self._by_codepoints.get(tuple(codepoints))
+
+    def _put(self, entry: CompatEntry):
+        self._by_identifier[entry.identifier] = entry
+        self._by_codepoints[entry.codepoints] = entry
+
+    def _remove(self, entry: CompatEntry):
+        del self._by_identifier[entry.identifier]
+        del self._by_codepoints[entry.codepoints]
+
+    def _check_new(self, entry: CompatEntry, replacing: Optional[CompatEntry] = None):
+        existing = self._by_identifier.get(entry.identifier)
+        if existing is not None and existing is not replacing:
+            raise ValueError(f"Identifier {entry.identifier:04X} is already used")
+        existing = self._by_codepoints.get(entry.codepoints)
+        if existing is not None and existing is not replacing:
+            raise ValueError(
+                f"{format_entry(entry)} repeats the codepoints of "
+                f"{existing.identifier:04X}"
+            )
+
+    def _record(self, before: Optional[CompatEntry], after: Optional[CompatEntry]):
+        if self._undo is not None:
+            self._undo.append((before, after))
+
+    def insert(self, entry: CompatEntry):
+        entry = CompatEntry(*entry[:3], tuple(entry.codepoints))
+        self._check_new(entry)
+        self._put(entry)
+        self._record(None, entry)
+
+    def update(self, entry: CompatEntry):
+        """Replace the entry with entry's identifier."""
+        entry = CompatEntry(*entry[:3], tuple(entry.codepoints))
+        before = self._by_identifier.get(entry.identifier)
+        if before is None:
+            raise ValueError(f"No entry {entry.identifier:04X} to update")
+        self._check_new(entry, before)
+        self._remove(before)
+        self._put(entry)
+        self._record(before, entry)
+
+    def delete(self, identifier: int) -> CompatEntry:
+        before = self._by_identifier.get(identifier)
+        if before is None:
+            raise ValueError(f"No entry {identifier:04X} to delete")
+        self._remove(before)
+        self._record(before, None)
+        return before
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator["MetadataStore"]:
+        """Undo every change made inside if anything raises. Nested
+        transactions are part of the outermost one."""
+        if self._undo is not None:
+            yield self
+            return
+        self._undo = []
+        try:
+            yield self
+        except BaseException:
+            for before, after in reversed(self._undo):
+                if after is not None:
+                    self._remove(after)
+                if before is not None:
+                    self._put(before)
+            raise
+        finally:
+            self._undo = None
+
+    def apply(
+        self,
+        inserts: Iterable[CompatEntry] = (),
+        updates: Iterable[CompatEntry] = (),
+        deletes: Iterable[int] = (),
+    ):
+        """Deletes, then updates, then inserts; all of them or none."""
+        with self.transaction():
+            for identifier in deletes:
+                self.delete(identifier)
+            for entry in updates:
+                self.update(entry)
+            for entry in inserts:
+                self.insert(entry)
+
+    def totext(self) -> str:
+        return _HEADER + "".join(format_entry(e) + "\n" for e in self)
+
+    def tocolumns(self) -> CompatColumns:
+        return CompatColumns.from_compat_entries(self)
+
+    def save(
+        self, text_file: Optional[Path] = None, sidecar_file: Optional[Path] = None
+    ):
+        """Write emoji_metadata.txt and its sidecar by default. Given only
+        text_file, no sidecar is written."""
+        if text_file is None:
+            text_file = compat_metadata.emoji_metadata_file()
+            sidecar_file = compat_metadata.emoji_metadata_sidecar_file()
+        text = self.totext().encode("utf-8")
+        # text first, a sidecar left behind by a failure no longer matches it
+        compat_metadata.write_atomically(text_file, text)
+        if sidecar_file is not None:
+            compat_metadata.write_sidecar(self.tocolumns(), text, sidecar_file)
+
+        compat_metadata.clear_emoji_compat_metadata_cache()
@@ -0,0 +1,144 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Hands out Private Use Area codepoints to use as emoji identifiers.
+
+What is still free is kept as sorted, disjoint intervals so allocating,
+reserving or checking a codepoint is a bisect away rather than a walk over
+the PUA.
+"""
+
+import bisect
+from emojicompat.compat_metadata import CompatEntry, emoji_compat_metadata
+from typing import Iterable, List, Optional, Tuple
+
+
+# Inclusive
+PUA_RANGES = ((0xE000, 0xF8FF), (0xF0000, 0xFFFFD), (0x100000, 0x10FFFD))
+
+
+def is_pua(codepoint: int) -> bool:
+    return any(start <= codepoint <= end for start, end in PUA_RANGES)
+
+
+def parse_range(value: str) -> Tuple[int, int]:
+    """(start, end) from hex "F0000-F00FF" or a single "F0000"."""
+    start, _, end = value.partition("-")
+    start = int(start, 16)
+    return start, int(end, 16) if end else start
+
+
+def _runs(codepoints: Iterable[int]) -> Iterable[Tuple[int, int]]:
+    # sorted codepoints => inclusive runs of consecutive ones
+    start = end = None
+    for cp in sorted(set(codepoints)):
+        if end is not None and cp == end + 1:
+            end = cp
+            continue
+        if start is not None:
+            yield start, end
+        start = end = cp
+    if start is not None:
+        yield start, end
+
+
+class PuaAllocator:
+    """Allocates PUA no one uses, lowest first.
+
+    Unless reuse_gaps, allocation starts after the highest codepoint in used,
+    so identifiers keep increasing release to release."""
+
+    def __init__(
+        self,
+        used: Iterable[int] = (),
+        reserved: Iterable[Tuple[int, int]] = (),
+        reuse_gaps: bool = False,
+    ):
+        # free[i] is [_starts[i], _ends[i]]
+        self._starts = [start for start, _ in PUA_RANGES]
+        self._ends = [end for _, end in PUA_RANGES]
+        highest = None
+        for start, end in _runs(used):
+            self.reserve(start, end)
+            highest = end
+        if highest is not None and not reuse_gaps:
+            self.reserve(0, highest)
+        for start, end in reserved:
+            self.reserve(start, end)
+
+    @classmethod
+    def from_compat_metadata(
+        cls,
+        entries: Optional[Iterable[CompatEntry]] = None,
+        reserved: Iterable[Tuple[int, int]] = (),
+        reuse_gaps: bool = False,
+    ) -> "PuaAllocator":
+        """Avoiding the identifiers of entries, emoji_compat_metadata() if None."""
+        if entries is None:
+            entries = emoji_compat_metadata()
+        return cls((e.identifier for e in entries), reserved, reuse_gaps)
+
+    def __contains__(self, codepoint: int) -> bool:
+        """True if codepoint is free."""
+        i = bisect.bisect_left(self._ends, codepoint)
+        return i < len(self._starts) and self._starts[i] <= codepoint
+
+    def free_count(self) -> int:
+        return sum(e - s + 1 for s, e in zip(self._starts, self._ends))
+
+    def free_ranges(self) -> List[Tuple[int, int]]:
+        return list(zip(self._starts, self._ends))
+
+    def reserve(self, start: int, end: Optional[int] = None):
+        """Never allocate start..end, inclusive; free or not, PUA or not."""
+        if end is None:
+            end = start
+        if end < start:
+            raise ValueError(f"Empty range {start:04X}-{end:04X}")
+        # the free intervals overlapping start..end are [lo, hi)
+        lo = bisect.bisect_left(self._ends, start)
+        hi = bisect.bisect_right(self._starts, end)
+        if lo >= hi:
+            return
+        replacement_starts = []
+        replacement_ends = []
+        if self._starts[lo] < start:
+            replacement_starts.append(self._starts[lo])
+            replacement_ends.append(start - 1)
+        if self._ends[hi - 1] > end:
+            replacement_starts.append(end + 1)
+            replacement_ends.append(self._ends[hi - 1])
+        self._starts[lo:hi] = replacement_starts
+        self._ends[lo:hi] = replacement_ends
+
+    def allocate(self) -> int:
+        return self.allocate_many(1)[0]
+
+    def allocate_many(self, count: int) -> List[int]:
+        """count codepoints, ascending, each interval taken a slice at a time."""
+        if count > self.free_count():
+            raise ValueError(f"Only {self.free_count()} PUA left, {count} wanted")
+        allocated: List[int] = []
+        taken = 0
+        while len(allocated) < count:
+            start, end = self._starts[taken], self._ends[taken]
+            stop = min(end + 1, start + count - len(allocated))
+            allocated.extend(range(start, stop))
+            if stop > end:
+                taken += 1
+            else:
+                self._starts[taken] = stop
+        del self._starts[:taken]
+        del self._ends[:taken]
+        return allocated
@@ -0,0 +1,126 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A trie of codepoint sequences.
+
+Lets a walk over ligatures give up on a sequence as soon as its prefix
+can't be the start of any entry.
+"""
+
+from typing import Dict, Generic, Iterable, Iterator, Optional, Tuple, TypeVar
+
+
+T = TypeVar("T")
+
+
+class TrieNode(Generic[T]):
+    __slots__ = ("children", "has_value", "value")
+
+    def __init__(self):
+        self.children: Dict[int, "TrieNode[T]"] = {}
+        self.has_value = False
+        self.value: Optional[T] = None
+
+    def child(self, codepoint: Optional[int]) -> Optional["TrieNode[T]"]:
+        """None if no sequence continues with codepoint, or codepoint is None."""
+        return self.children.get(codepoint)
+
+    def descend(self, codepoints: Iterable[Optional[int]]) -> Optional["TrieNode[T]"]:
+        """Follows codepoints down, stopping at the first that leads nowhere.
+
+        codepoints is consumed lazily so nothing past that is computed."""
+        node: TrieNode[T] = self
+        for codepoint in codepoints:
+            child = node.child(codepoint)
+            if child is None:
+                return None
+            node = child
+        return node
+
+
+class SequenceTrie(Generic[T]):
+    """Maps codepoint sequences to values. Removing a value keeps its nodes."""
+
+    def __init__(self, items: Iterable[Tuple[Tuple[int, ...], T]] = ()):
+        self.root: TrieNode[T] = TrieNode()
+        self._len = 0
+        for codepoints, value in items:
+            self[codepoints] = value
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __setitem__(self, codepoints: Tuple[int, ...], value: T):
+        node = self.root
+        for codepoint in codepoints:
+            child = node.children.get(codepoint)
+            if child is None:
+                child = node.children[codepoint] = TrieNode()
+            node = child
+        if not node.has_value:
+            self._len += 1
+        node.has_value = True
+        node.value = value
+
+    def _node_with_value(self, codepoints: Tuple[int, ...]) -> Optional[TrieNode[T]]:
+        node = self.root.descend(codepoints)
+        if node is None or not node.has_value:
+            return None
+        return node
+
+    def __contains__(self, codepoints: Tuple[int, ...]) -> bool:
+        return self._node_with_value(codepoints) is not None
+
+    def get(self, codepoints: Tuple[int, ...], default: Optional[T] = None):
+        node = self._node_with_value(codepoints)
+        return default if node is None else node.value
+
+    def pop(self, codepoints: Tuple[int, ...], default: Optional[T] = None):
+        node = self._node_with_value(codepoints)
+        if node is None:
+            return default
+        value = node.value
+        node.has_value = False
+        node.value = None
+        self._len -= 1
+        return value
+
+    def items(self) -> Iterator[Tuple[Tuple[int, ...], T]]:
+        """Depth first, children in the order they were added."""
+        stack = [((), self.root)]
+        while stack:
+            codepoints, node = stack.pop()
+            if node.has_value:
+                yield codepoints, node.value
+            stack.extend(
+                (codepoints + (cp,), child)
+                for cp, child in reversed(node.children.items())
+            )
+
+    def values(self) -> Iterator[T]:
+        for _, value in self.items():
+            yield value
+
+    def longest_prefix(self, codepoints: Iterable[int]) -> Tuple[int, ...]:
+        """The longest prefix of codepoints that some entry starts with.
+
+        Handy to see how far an unmatched sequence got."""
+        prefix = []
+        node = self.root
+        for codepoint in codepoints:
+            node = node.children.get(codepoint)
+            if node is None:
+                break
+            prefix.append(codepoint)
+        return tuple(prefix)
@@ -0,0 +1,201 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Save a font by copying the tables that were never loaded from its file.
+
+TTFont.save reads every table into memory, checksums it, writes it and then
+rewrites the whole file again to reorder the tables. Here only the loaded
+tables are compiled; the rest are copied byte for byte from an mmap of the
+source, keeping their position in the file and their recorded checksum.
+"""
+
+import mmap
+import os
+from fontTools import ttLib
+from fontTools.misc.textTools import Tag
+from fontTools.ttLib.sfnt import calcChecksum
+from fontTools.ttLib.ttFont import getSearchRange
+from pathlib import Path
+import shutil
+import struct
+import tempfile
+from typing import BinaryIO, Dict, List, NamedTuple, Optional, Union
+
+
+_SFNT_HEADER = struct.Struct(">4sHHHH")
+_DIRECTORY_ENTRY = struct.Struct(">4sIII")
+# head.checkSumAdjustment
+_CHECKSUM_ADJUSTMENT = struct.Struct(">I")
+_CHECKSUM_ADJUSTMENT_OFFSET = 8
+_CHECKSUM_MAGIC = 0xB1B0AFBA
+_COPY_CHUNK = 1 << 20
+
+
+class _TableRecord(NamedTuple):
+    tag: Tag
+    checksum: int
+    length: int
+    # compiled data, or None to copy length bytes from source_offset
+    data: Optional[bytes]
+    source_offset: int
+
+
+def can_patch(font: ttLib.TTFont) -> bool:
+    """True if font was read from a plain, single font, sfnt file."""
+    reader = font.reader
+    return (
+        reader is not None
+        and reader.flavor is None
+        and getattr(reader, "numFonts", None) is None
+    )
+
+
+def _pad(length: int) -> int:
+    return (4 - length % 4) % 4
+
+
+def _compiled_tables(font: ttLib.TTFont, tags: List[Tag]) -> Dict[Tag, bytes]:
+    # compile loaded tables after the tables they depend on, as TTFont.save does
+    compiled: Dict[Tag, bytes] = {}
+
+    def compile_table(tag: Tag):
+        if tag in compiled:
+            return
+        for dependency in ttLib.getTableClass(tag).dependencies:
+            if dependency in tags and font.isLoaded(dependency):
+                compile_table(Tag(dependency))
+        compiled[tag] = font.getTableData(tag)
+
+    for tag in tags:
+        if font.isLoaded(tag):
+            compile_table(tag)
+    return compiled
+
+
+def _table_records(font: ttLib.TTFont) -> List[_TableRecord]:
+    if font.recalcTimestamp and "head" in font:
+        # make sure 'head' is loaded so modified is updated, as TTFont.save does
+        font["head"]
+
+    tags = [Tag(t) for t in font.keys() if t != "GlyphOrder"]
+    compiled = _compiled_tables(font, tags)
+
+    records = []
+    for tag in tags:
+        data = compiled.get(tag)
+        if data is None:
+            entry = font.reader.tables[tag]
+            records.append(
+                _TableRecord(tag, entry.checkSum, entry.length, None, entry.offset)
+            )
+            continue
+        if tag == "head":
+            data = bytearray(data)
+            _CHECKSUM_ADJUSTMENT.pack_into(data, _CHECKSUM_ADJUSTMENT_OFFSET, 0)
+            data = bytes(data)
+        records.append(_TableRecord(tag, calcChecksum(data), len(data), data, -1))
+    return records
+
+
+def _record_data(record: _TableRecord, source_map: mmap.mmap) -> bytes:
+    if record.data is not None:
+        return record.data
+    return source_map[record.source_offset : record.source_offset + record.length]
+
+
+def _copy_range(source_map: mmap.mmap, offset: int, length: int, out: BinaryIO):
+    # in chunks, so a big table like CBDT is never all in memory at once
+    end = offset + length
+    for start in range(offset, end, _COPY_CHUNK):
+        out.write(source_map[start : min(start + _COPY_CHUNK, end)])
+
+
+def _physical_order(font: ttLib.TTFont, records: List[_TableRecord]):
+    # keep the order of the source file, by offset, new tables go at the end
+    position = {tag: entry.offset for tag, entry in font.reader.tables.items()}
+    return sorted(
+        records, key=lambda r: (r.tag not in position, position.get(r.tag, 0))
+    )
+
+
+def save_patched(
+    font: ttLib.TTFont,
+    source_path: Union[str, Path],
+    out_path: Optional[Union[str, Path]] = None,
+):
+    """Write font to out_path, source_path if None, copying the tables that
+    were never loaded from source_path, which must be the file font was read
+    from. The file is written alongside and then moved into place."""
+    if not can_patch(font):
+        raise ValueError(
+            "Only plain sfnt fonts, not collections or woff, can be patched"
+        )
+    source_path = Path(source_path)
+    out_path = Path(out_path) if out_path is not None else source_path
+
+    records = _table_records(font)
+    directory = sorted(records, key=lambda r: r.tag)
+    search_range, entry_selector, range_shift = getSearchRange(len(records), 16)
+
+    offset = _SFNT_HEADER.size + _DIRECTORY_ENTRY.size * len(records)
+    offsets: Dict[Tag, int] = {}
+    for record in _physical_order(font, records):
+        offsets[record.tag] = offset
+        offset += record.length + _pad(record.length)
+
+    header = bytearray(
+        _SFNT_HEADER.pack(
+            Tag(font.sfntVersion).tobytes(),
+            len(records),
+            search_range,
+            entry_selector,
+            range_shift,
+        )
+    )
+    for record in directory:
+        header += _DIRECTORY_ENTRY.pack(
+            record.tag.tobytes(), record.checksum, offsets[record.tag], record.length
+        )
+
+    # the file checksum is the sum of the table checksums, tables being padded
+    # with zeros, plus that of the header and directory
+    checksum = calcChecksum(header)
+    for record in records:
+        checksum += record.checksum
+    checksum_adjustment = (_CHECKSUM_MAGIC - checksum) & 0xFFFFFFFF
+
+    fd, tmp_path = tempfile.mkstemp(prefix=out_path.name, dir=out_path.parent)
+    try:
+        shutil.copymode(out_path if out_path.exists() else source_path, tmp_path)
+        with open(source_path, "rb") as source, os.fdopen(fd, "wb") as out:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as source_map:
+                out.write(header)
+                for record in _physical_order(font, records):
+                    if record.tag == "head":
+                        data = bytearray(_record_data(record, source_map))
+                        _CHECKSUM_ADJUSTMENT.pack_into(
+                            data, _CHECKSUM_ADJUSTMENT_OFFSET, checksum_adjustment
+                        )
+                        out.write(data)
+                    elif record.data is not None:
+                        out.write(record.data)
+                    else:
+                        _copy_range(
+                            source_map, record.source_offset, record.length, out
+                        )
+                    out.write(bytes(_pad(record.length)))
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
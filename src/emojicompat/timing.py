@@ -0,0 +1,99 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Opt-in per stage timing for emojicompat.
+
+Register a hook with add_stage_hook to receive a StageTiming as each stage
+finishes. With no hooks registered stage() does nothing at all.
+"""
+
+import contextlib
+import dataclasses
+import json
+import sys
+import time
+import tracemalloc
+from typing import Callable, Iterator, List, Optional, TextIO
+
+
+@dataclasses.dataclass
+class StageTiming:
+    font: str
+    stage: str
+    wall_seconds: float
+    cpu_seconds: float
+    # None unless tracemalloc is tracing
+    peak_memory_bytes: Optional[int] = None
+
+    def json(self) -> str:
+        return json.dumps(dataclasses.asdict(self))
+
+
+StageHook = Callable[[StageTiming], None]
+
+
+_HOOKS: List[StageHook] = []
+
+
+def add_stage_hook(hook: StageHook):
+    _HOOKS.append(hook)
+
+
+def remove_stage_hook(hook: StageHook):
+    _HOOKS.remove(hook)
+
+
+@contextlib.contextmanager
+def stage(name: str, font: str = "") -> Iterator[None]:
+    # Stages are not expected to nest; the memory peak is reset on entry
+    if not _HOOKS:
+        yield
+        return
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        timing = StageTiming(
+            font,
+            name,
+            time.perf_counter() - wall_start,
+            time.process_time() - cpu_start,
+            tracemalloc.get_traced_memory()[1] if tracing else None,
+        )
+        for hook in list(_HOOKS):
+            hook(timing)
+
+
+@contextlib.contextmanager
+def print_stages(out: Optional[TextIO] = None) -> Iterator[None]:
+    """Print every stage as a JSON line, to out or else stderr, and trace memory
+    while active. stdout is left to what is being timed."""
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    hook = lambda timing: print(
+        timing.json(), file=out if out is not None else sys.stderr
+    )
+    add_stage_hook(hook)
+    try:
+        yield
+    finally:
+        remove_stage_hook(hook)
+        if started_tracing:
+            tracemalloc.stop()
@@ -15,50 +15,259 @@
 # TODO if/when FontTools provides traversal algorithm delete dfs/bfs base table
 
 from collections import deque
+from fontTools import ttLib
 from fontTools.ttLib.tables import otBase
-from fontTools.ttLib.tables import otTables
-from fontTools.ttLib.tables import otConverters
-from typing import Callable, Deque, Iterable, List, Tuple
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Deque,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+import weakref
+
+if TYPE_CHECKING:
+    # otTables builds every OpenType table class on import; fonts load it
+    # themselves once a table like GSUB is read
+    from fontTools.ttLib.tables import otTables
+
+
+_LOOKUP_TYPE_LIGATURE = 4
+_LOOKUP_TYPE_EXTENSION = 7
 
 
 SubTablePath = Tuple[otBase.BaseTable.SubTableEntry, ...]
 
-# Given f(current frontier, new entries) add new entries to frontier
-AddToFrontierFn = Callable[[Deque[SubTablePath], List[SubTablePath]], None]
+# Given a table return True to skip everything below it
+PruneFn = Callable[[otBase.BaseTable], bool]
+
+
+# A visited table. Nodes share their parents so no per-node path is built.
+class TraversalNode(NamedTuple):
+    entry: otBase.BaseTable.SubTableEntry
+    parent: Optional["TraversalNode"]
+    depth: int
+
+    @property
+    def value(self) -> otBase.BaseTable:
+        return self.entry.value
+
+    def path(self) -> SubTablePath:
+        entries = []
+        node: Optional[TraversalNode] = self
+        while node is not None:
+            entries.append(node.entry)
+            node = node.parent
+        entries.reverse()
+        return tuple(entries)
 
 
 def dfs_base_table(
     root: otBase.BaseTable, root_accessor: str
 ) -> Iterable[SubTablePath]:
-    yield from _traverse_ot_data(
-        root, root_accessor, lambda frontier, new: frontier.extendleft(reversed(new))
-    )
+    for node in dfs_nodes(root, root_accessor):
+        yield node.path()
 
 
 def bfs_base_table(
     root: otBase.BaseTable, root_accessor: str
 ) -> Iterable[SubTablePath]:
-    yield from _traverse_ot_data(
-        root, root_accessor, lambda frontier, new: frontier.extend(new)
-    )
+    for node in bfs_nodes(root, root_accessor):
+        yield node.path()
 
 
-def _traverse_ot_data(
-    root: otBase.BaseTable, root_accessor: str, add_to_frontier_fn: AddToFrontierFn
-) -> Iterable[SubTablePath]:
-    # no visited because general otData is forward-offset only and thus cannot cycle
+# no visited because general otData is forward-offset only and thus cannot cycle
+
+
+def dfs_nodes(
+    root: otBase.BaseTable, root_accessor: str, prune: Optional[PruneFn] = None
+) -> Iterable[TraversalNode]:
+    node = TraversalNode(otBase.BaseTable.SubTableEntry(root_accessor, root), None, 0)
+    yield node
+    if prune is not None and prune(root):
+        return
 
-    frontier: Deque[SubTablePath] = deque()
-    frontier.append((otBase.BaseTable.SubTableEntry(root_accessor, root),))
+    # a stack of child iterators visits children in order without reversing them
+    stack = [(node, iter(root.iterSubTables()))]
+    while stack:
+        parent, children = stack[-1]
+        entry = next(children, None)
+        if entry is None:
+            stack.pop()
+            continue
+        node = TraversalNode(entry, parent, parent.depth + 1)
+        yield node
+        if prune is None or not prune(entry.value):
+            stack.append((node, iter(entry.value.iterSubTables())))
+
+
+def bfs_nodes(
+    root: otBase.BaseTable, root_accessor: str, prune: Optional[PruneFn] = None
+) -> Iterable[TraversalNode]:
+    frontier: Deque[TraversalNode] = deque()
+    frontier.append(
+        TraversalNode(otBase.BaseTable.SubTableEntry(root_accessor, root), None, 0)
+    )
     while frontier:
-        # path is (value, attr_name) tuples. attr_name is attr of parent to get value
-        path = frontier.popleft()
-        current = path[-1].value
+        node = frontier.popleft()
+        yield node
+        if prune is not None and prune(node.value):
+            continue
+        for entry in node.value.iterSubTables():
+            frontier.append(TraversalNode(entry, node, node.depth + 1))
+
+
+def iter_base_tables(
+    root: otBase.BaseTable,
+    of_type: Optional[Union[type, Tuple[type, ...]]] = None,
+    prune: Optional[PruneFn] = None,
+) -> Iterable[otBase.BaseTable]:
+    """Depth first over the tables alone, optionally only those of_type."""
+    stack = [iter((root,))]
+    while stack:
+        current = next(stack[-1], None)
+        if current is None:
+            stack.pop()
+            continue
+        if of_type is None or isinstance(current, of_type):
+            yield current
+        if prune is None or not prune(current):
+            stack.append(e.value for e in current.iterSubTables())
+
+
+def ligature_subtables(gsub: "otTables.GSUB") -> Iterable["otTables.LigatureSubst"]:
+    # Only ligature lookups, directly or wrapped in an extension, can hold
+    # ligatures so there is no need to look anywhere else
+    from fontTools.ttLib.tables.otTables import LigatureSubst
+
+    if gsub.LookupList is None:
+        return
+    for lookup in gsub.LookupList.Lookup:
+        if lookup.LookupType == _LOOKUP_TYPE_LIGATURE:
+            subtables = lookup.SubTable
+        elif lookup.LookupType == _LOOKUP_TYPE_EXTENSION:
+            subtables = [
+                st.ExtSubTable
+                for st in lookup.SubTable
+                if st.ExtensionLookupType == _LOOKUP_TYPE_LIGATURE
+            ]
+        else:
+            continue
+        for subtable in subtables:
+            if isinstance(subtable, LigatureSubst):
+                yield subtable
+
+
+def ligatures(gsub: "otTables.GSUB") -> Iterable[Tuple[Tuple[str, ...], str]]:
+    """Yields (component glyph names, ligature glyph name) in lookup order."""
+    for liga_subst in ligature_subtables(gsub):
+        for start_glyph, ligatures in liga_subst.ligatures.items():
+            for ligature in ligatures:
+                yield (start_glyph, *ligature.Component), ligature.LigGlyph
+
+
+def ligature_index(gsub: "otTables.GSUB") -> Dict[Tuple[str, ...], str]:
+    """Component glyph names => ligature glyph name; the first lookup wins."""
+    index: Dict[Tuple[str, ...], str] = {}
+    for components, ligature_glyph in ligatures(gsub):
+        index.setdefault(components, ligature_glyph)
+    return index
+
+
+# codepoint => glyph name
+Cmap = Dict[int, str]
+
+
+def format_12_cmaps(font: ttLib.TTFont) -> Tuple[Cmap, ...]:
+    return tuple(t.cmap for t in font["cmap"].tables if t.format == 12)
+
+
+def identical_cmaps(cmaps: Sequence[Cmap]) -> bool:
+    """True if every cmap has the same mappings. Shared dicts, as left by
+    _setup_pua, and differing sizes are decided without looking inside."""
+    if not cmaps:
+        return False
+    first = cmaps[0]
+    return all(c is first or (len(c) == len(first) and c == first) for c in cmaps[1:])
+
+
+def reverse_cmap(cmap: Cmap, skip: Callable[[int], bool]) -> Dict[str, int]:
+    """glyph name => codepoint for the codepoints that aren't skipped.
+
+    Raises ValueError if a glyph is mapped from more than one of them."""
+    reverse: Dict[str, int] = {}
+    for codepoint, glyph_name in cmap.items():
+        if skip(codepoint):
+            continue
+        if reverse.setdefault(glyph_name, codepoint) != codepoint:
+            raise ValueError("Can't safely reverse if values are non-unique")
+    return reverse
+
+
+class CmapIndex(NamedTuple):
+    # the format 12 cmaps of the font, all identical
+    cmaps: Tuple[Cmap, ...]
+    reverse: Dict[str, int]
+
+
+class _CachedCmapIndex(NamedTuple):
+    cmaps: Tuple[Cmap, ...]
+    length: int
+    skip: Callable[[int], bool]
+    index: CmapIndex
+
+    def matches(self, cmaps: Tuple[Cmap, ...], skip: Callable[[int], bool]) -> bool:
+        return (
+            self.skip is skip
+            and len(self.cmaps) == len(cmaps)
+            and all(a is b for a, b in zip(self.cmaps, cmaps))
+            and len(cmaps[0]) == self.length
+        )
+
+
+_CMAP_INDEXES: "weakref.WeakKeyDictionary[ttLib.TTFont, _CachedCmapIndex]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def cmap_index(font: ttLib.TTFont, skip: Callable[[int], bool]) -> CmapIndex:
+    """The format 12 cmaps of font, checked to be identical, and the reverse
+    of the first.
+
+    Cached on the font until the format 12 cmaps are replaced or change size;
+    changing where an existing, non-skipped, codepoint maps to in place isn't
+    noticed."""
+    cmaps = format_12_cmaps(font)
+    cached = _CMAP_INDEXES.get(font)
+    if cached is not None and cached.matches(cmaps, skip):
+        return cached.index
+
+    if not identical_cmaps(cmaps):
+        raise ValueError("All format 12 cmaps should be identical")
+    index = CmapIndex(cmaps, reverse_cmap(cmaps[0], skip))
+    _CMAP_INDEXES[font] = _CachedCmapIndex(cmaps, len(cmaps[0]), skip, index)
+    return index
+
 
-        yield path
+def keep_cmap_index(font: ttLib.TTFont, index: CmapIndex):
+    """Keep index cached for font after changing only skipped codepoints of
+    the first format 12 cmap and pointing the others at it."""
+    cached = _CMAP_INDEXES.get(font)
+    if cached is None or cached.index is not index:
+        return
+    cmaps = format_12_cmaps(font)
+    if all(c is index.cmaps[0] for c in cmaps):
+        _CMAP_INDEXES[font] = cached._replace(
+            cmaps=cmaps, length=len(cmaps[0]), index=index._replace(cmaps=cmaps)
+        )
 
-        new_entries = []
-        for subtable_entry in current.iterSubTables():
-            new_entries.append(path + (subtable_entry,))
 
-        add_to_frontier_fn(frontier, new_entries)
+def forget_cmap_index(font: ttLib.TTFont):
+    """Drop the index cached for font, after changing codepoints it doesn't
+    skip."""
+    _CMAP_INDEXES.pop(font, None)
@@ -0,0 +1,189 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.bitmap_metrics import *
+from emojicompat.emojicompat import _check_bitmap_metrics
+from emojicompat.flatbuffer import FlatbufferItem, FlatbufferList, FlatbufferListView
+from fontTools import ttLib
+from fontTools.ttLib.tables import E_B_L_C_
+import copy
+import io
+import pytest
+import struct
+from testdata_helper import testdata_dir
+
+
+def _smiley(lazy=None) -> ttLib.TTFont:
+    return ttLib.TTFont(testdata_dir() / "Smiley.ttf", lazy=lazy)
+
+
+def _decoded_metrics(font: ttLib.TTFont):
+    # the slow way, decoding every bitmap
+    result = {}
+    for strike, strike_data in zip(font["CBLC"].strikes, font["CBDT"].strikeData):
+        ppem = strike.bitmapSizeTable.ppemX, strike.bitmapSizeTable.ppemY
+        for glyph, bitmap in strike_data.items():
+            bitmap.decompile()
+            result.setdefault(font.getGlyphID(glyph), []).append(
+                StrikeMetrics(*ppem, bitmap.metrics.width, bitmap.metrics.height)
+            )
+    return result
+
+
+@pytest.mark.parametrize("lazy", [None, True])
+def test_font_strike_metrics(lazy):
+    font = _smiley(lazy)
+    metrics = font_strike_metrics(font)
+
+    assert metrics == {1: [StrikeMetrics(109, 109, 136, 128)]}
+    assert not font.isLoaded("CBDT")
+    assert not font.isLoaded("CBLC")
+    assert metrics == _decoded_metrics(_smiley())
+    font.close()
+
+
+def test_only_requested_glyphs():
+    assert font_strike_metrics(_smiley(), {2, 3}) == {}
+
+
+def test_no_bitmaps():
+    assert font_strike_metrics(ttLib.TTFont(testdata_dir() / "Handshake.ttf")) == {}
+
+
+@pytest.mark.parametrize("index_format", [1, 3, 4])
+def test_index_formats(index_format):
+    font = _smiley()
+    strike = font["CBLC"].strikes[0]
+    old = strike.indexSubTables[0]
+    new = E_B_L_C_.eblc_sub_table_classes[index_format](None, font)
+    new.indexFormat = index_format
+    new.imageFormat = old.imageFormat
+    new.firstGlyphIndex = old.firstGlyphIndex
+    new.lastGlyphIndex = old.lastGlyphIndex
+    new.names = old.names
+    new.locations = old.locations
+    strike.indexSubTables[0] = new
+    font["CBDT"]
+    buf = io.BytesIO()
+    font.save(buf)
+    buf.seek(0)
+
+    font = ttLib.TTFont(buf)
+    assert font["CBLC"].strikes[0].indexSubTables[0].indexFormat == index_format
+    assert font_strike_metrics(ttLib.TTFont(buf)) == _decoded_metrics(font)
+
+
+def _cblc(subtable: bytes, first: int, last: int) -> bytes:
+    # one strike of one index subtable
+    array_offset = 8 + 48
+    return (
+        struct.pack(">HHI", 3, 0, 1)
+        + struct.pack(
+            ">IIII24xHHBBBb", array_offset, 0, 1, 0, first, last, 72, 72, 32, 1
+        )
+        + struct.pack(">HHI", first, last, 8)
+        + subtable
+    )
+
+
+def _big_metrics(width: int, height: int) -> bytes:
+    return struct.pack(">BBbbBbbB", height, width, 0, 0, width, 0, 0, height)
+
+
+def test_index_format_2():
+    # same size images, metrics in the index, so cbdt is never read
+    subtable = struct.pack(">HHII", 2, 19, 4, 100) + _big_metrics(32, 30)
+    metrics = strike_metrics(_cblc(subtable, 5, 7), b"")
+
+    assert metrics == {g: [StrikeMetrics(72, 72, 32, 30)] for g in (5, 6, 7)}
+
+
+def test_index_format_5():
+    subtable = (
+        struct.pack(">HHII", 5, 19, 4, 100)
+        + _big_metrics(32, 30)
+        + struct.pack(">I2H", 2, 5, 9)
+    )
+    metrics = strike_metrics(_cblc(subtable, 5, 9), b"")
+
+    assert metrics == {g: [StrikeMetrics(72, 72, 32, 30)] for g in (5, 9)}
+
+
+def test_truncated():
+    subtable = struct.pack(">HHI", 1, 17, 4) + struct.pack(">2I", 0, 100)
+    with pytest.raises(ValueError):
+        strike_metrics(_cblc(subtable, 5, 5), b"\0\0")
+
+
+def test_item_glyphs():
+    font = _smiley()
+    flat_list = FlatbufferListView.fromfont(font)
+    glyphs = item_glyphs(font, flat_list.items)
+
+    # only U+263A is in the cmap, through its codepoint as no PUA is mapped
+    (identifier,) = glyphs
+    assert glyphs[identifier] == "smileface"
+    item = next(i for i in flat_list.items if i.identifier == identifier)
+    assert item.codepoints == (0x263A,)
+
+
+def test_check_bitmap_metrics(capsys):
+    font = _smiley()
+    assert _check_bitmap_metrics(font, FlatbufferListView.fromfont(font))
+    assert capsys.readouterr().out == ""
+
+    flat_list = FlatbufferList(
+        1, (FlatbufferItem(0xF0000, True, 19, 1, 72, 72, (0x263A,)),), ""
+    )
+    assert not _check_bitmap_metrics(font, flat_list)
+    assert capsys.readouterr().out == (
+        "U+263a bitmap smileface is 136x128 at 109ppem; metadata says 72x72\n"
+    )
+
+
+def _with_half_size_strike(font: ttLib.TTFont) -> ttLib.TTFont:
+    strike = copy.deepcopy(font["CBLC"].strikes[0])
+    strike.bitmapSizeTable.ppemX = strike.bitmapSizeTable.ppemY = 54
+    bitmaps = {}
+    for glyph, bitmap in font["CBDT"].strikeData[0].items():
+        bitmap.decompile()
+        bitmap = copy.deepcopy(bitmap)
+        bitmap.metrics.width //= 2
+        bitmap.metrics.height //= 2
+        bitmaps[glyph] = bitmap
+    font["CBLC"].strikes.insert(0, strike)
+    font["CBDT"].strikeData.insert(0, bitmaps)
+    buf = io.BytesIO()
+    font.save(buf)
+    buf.seek(0)
+    return ttLib.TTFont(buf)
+
+
+def test_check_bitmap_metrics_multiple_strikes(capsys):
+    font = _with_half_size_strike(_smiley())
+    assert font_strike_metrics(font) == {
+        1: [StrikeMetrics(54, 54, 68, 64), StrikeMetrics(109, 109, 136, 128)]
+    }
+
+    # only the largest strike has to match
+    assert _check_bitmap_metrics(font, FlatbufferListView.fromfont(font))
+    assert capsys.readouterr().out == ""
+
+    flat_list = FlatbufferList(
+        1, (FlatbufferItem(0xF0000, True, 19, 1, 68, 64, (0x263A,)),), ""
+    )
+    assert not _check_bitmap_metrics(font, flat_list)
+    assert capsys.readouterr().out == (
+        "U+263a bitmap smileface is 136x128 at 109ppem; metadata says 68x64\n"
+    )
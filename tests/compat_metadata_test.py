@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
+from pathlib import Path
 import pytest
 from typing import NamedTuple, Tuple
 
@@ -34,3 +36,78 @@ def test_emoji_metadata_superset_2_028_emoji():
 
     for i in range(len(flat_entries)):
         assert flat_entries[i] == compat_entries[i], f"Mismatch at [{i}]"
+
+
+def test_sidecar_matches_text():
+    text_file = emoji_metadata_file()
+    from_text = load_emoji_metadata(text_file)
+
+    assert load_emoji_metadata(text_file, emoji_metadata_sidecar_file()) == from_text
+    assert emoji_compat_metadata() == from_text
+
+
+def test_stale_sidecar_is_ignored(tmp_path):
+    text_file = tmp_path / "emoji_metadata.txt"
+    sidecar_file = tmp_path / "emoji_metadata.bin"
+    text_file.write_text("#id sdkAdded compatAdded codepoints\nF0001 19 1 1F1EA\n")
+    compile_emoji_metadata(text_file, sidecar_file)
+
+    assert load_emoji_metadata(text_file, sidecar_file) == (
+        CompatEntry(0xF0001, 19, 1, (0x1F1EA,)),
+    )
+
+    with open(text_file, "a") as f:
+        f.write("F0002 19 1 1F469 200D 1F467\n")
+    assert load_emoji_metadata(text_file, sidecar_file) == (
+        CompatEntry(0xF0001, 19, 1, (0x1F1EA,)),
+        CompatEntry(0xF0002, 19, 1, (0x1F469, 0x200D, 0x1F467)),
+    )
+
+
+def test_emoji_compat_metadata_is_memoized():
+    assert emoji_compat_metadata() is emoji_compat_metadata()
+
+
+def test_emoji_compat_metadata_columns_are_copies():
+    columns = emoji_compat_metadata_columns()
+    columns.append(0xFFFFD, False, 99, 99, 0, 0, (0x1F600,))
+    columns.identifier[0] = 0
+
+    assert emoji_compat_metadata_columns() == CompatColumns.from_compat_entries(
+        emoji_compat_metadata()
+    )
+
+
+def test_emoji_compat_metadata_reads_text_once(monkeypatch):
+    reads = []
+    read_bytes = Path.read_bytes
+
+    def counting_read_bytes(path):
+        reads.append(path)
+        return read_bytes(path)
+
+    monkeypatch.setattr(Path, "read_bytes", counting_read_bytes)
+    clear_emoji_compat_metadata_cache()
+    try:
+        emoji_compat_metadata_columns()
+        emoji_compat_metadata()
+        sha1 = emoji_compat_metadata_sha1()
+    finally:
+        clear_emoji_compat_metadata_cache()
+
+    assert reads.count(emoji_metadata_file()) == 1
+    assert sha1 == hashlib.sha1(emoji_metadata_file().read_bytes()).hexdigest()
+
+
+def test_columns():
+    text_file = emoji_metadata_file()
+    from_text = load_emoji_metadata_columns(text_file)
+    from_sidecar = load_emoji_metadata_columns(text_file, emoji_metadata_sidecar_file())
+    entries = load_emoji_metadata(text_file)
+
+    assert from_sidecar == from_text
+    assert from_text == CompatColumns.from_compat_entries(entries)
+    assert from_text.compat_entries() == entries
+    assert len(from_text) == len(entries)
+    assert from_text.compat_entry(42) == entries[42]
+    assert from_text.offsets[-1] == len(from_text.codepoints)
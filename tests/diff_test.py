@@ -0,0 +1,162 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.diff import *
+from emojicompat.emojicompat import _diff_fonts
+from emojicompat import flatbuffer
+from emojicompat.flatbuffer import FlatbufferItem, FlatbufferList, FlatbufferListView
+import subprocess
+import sys
+from testdata_helper import read_2_028_raw, testdata_dir
+
+
+def _sample() -> FlatbufferListView:
+    return FlatbufferListView.fromflatbytes(read_2_028_raw())
+
+
+def test_identical_lists_short_circuit():
+    before = _sample()
+    after = _sample()
+
+    assert not diff(before, after)
+    # equal bytes, nothing was decoded
+    assert before.items.decoded_count() == after.items.decoded_count() == 0
+
+
+def test_equal_but_differently_held_lists():
+    before = _sample()
+    result = diff(before, before.materialize())
+
+    assert not result
+    assert list(result.lines()) == ["0 added, 0 removed, 0 remapped, 0 changed"]
+
+
+def test_content_digest():
+    flat_list = _sample().materialize()
+
+    assert content_digest(flat_list) == content_digest(
+        FlatbufferList.fromflatbytes(read_2_028_raw(), columnar=True)
+    )
+    assert content_digest(flat_list) != content_digest(
+        flat_list._replace(source_sha=b"other")
+    )
+    assert content_digest(flat_list) != content_digest(_sample())
+
+
+def test_content_digest_cached(monkeypatch):
+    before = FlatbufferList.fromflatbytes(read_2_028_raw(), columnar=True)
+    after = before._replace(source_sha=b"other")
+    digest = content_digest(before)
+
+    def fail(*args):
+        raise AssertionError("columns copied or hashed again")
+
+    monkeypatch.setattr(FlatbufferList, "tocolumns", fail)
+    monkeypatch.setattr(flatbuffer, "_columns_digest", fail)
+    # same items, so the hash of their columns is reused
+    assert content_digest(before) == digest
+    assert content_digest(after) != digest
+    assert diff(before, after).source_sha == (before.source_sha, b"other")
+
+
+def test_diff():
+    before = _sample()
+    items = list(before.items)
+    remapped = items[3]._replace(identifier=0xF9999)
+    changed = items[5]._replace(sdk_added=99, width=1)
+    new_codepoints = items[7]._replace(codepoints=(0x1F600, 0x1F601))
+    added = FlatbufferItem(0xFAAAA, True, 1, 2, 136, 128, (0x1F600, 0x1F602))
+    removed = items[10]
+    items[3] = remapped
+    items[5] = changed
+    items[7] = new_codepoints
+    del items[10]
+    items.append(added)
+    after = FlatbufferList(before.version + 1, tuple(items), b"new sha")
+
+    result = diff(before, after)
+
+    assert result.version == (before.version, before.version + 1)
+    assert result.source_sha == (before.source_sha, b"new sha")
+    assert result.added == [added]
+    assert result.removed == [removed]
+    assert result.remapped == [ItemChange(before.items[3], remapped)]
+    assert result.changed == [
+        ItemChange(before.items[5], changed),
+        ItemChange(before.items[7], new_codepoints),
+    ]
+    assert result.changed[0].fields() == ("sdk_added", "width")
+    assert result.changed[1].fields() == ("codepoints",)
+    assert list(result.lines())[-1] == "1 added, 1 removed, 1 remapped, 2 changed"
+
+
+def test_diff_fonts():
+    smiley = testdata_dir() / "Smiley.ttf"
+    result = _diff_fonts(smiley, smiley)
+    assert not result
+
+    result = _diff_fonts(smiley, testdata_dir() / "Handshake.ttf")
+    assert result
+    assert not result.added
+    assert len(result.removed) > 1000
+
+
+def test_duplicate_sequences():
+    a = FlatbufferItem(0xF0000, True, 19, 1, 136, 128, (0x1F600,))
+    b = a._replace(identifier=0xF0001)
+    before = FlatbufferList(1, (a, b), b"sha")
+
+    result = diff(before, before._replace(items=(a,)))
+    assert result.removed == [b]
+    assert list(result.lines())[-1] == "0 added, 1 removed, 0 remapped, 0 changed"
+
+    result = diff(before._replace(items=(a,)), before)
+    assert result.added == [b]
+
+    result = diff(before, before._replace(items=(b, a)))
+    assert result.remapped == [ItemChange(a, b), ItemChange(b, a)]
+
+
+def test_reordered():
+    a = FlatbufferItem(0xF0000, True, 19, 1, 136, 128, (0x1F600,))
+    b = FlatbufferItem(0xF0001, True, 19, 1, 136, 128, (0x1F601,))
+    before = FlatbufferList(1, (a, b), b"sha")
+
+    result = diff(before, before._replace(items=(b, a)))
+    assert result
+    assert result.reordered
+    assert list(result.lines())[0] == "entries reordered"
+
+
+def test_cli_diff_font_with_itself():
+    smiley = str(testdata_dir() / "Smiley.ttf")
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "emojicompat.emojicompat",
+            "--op",
+            "diff",
+            "--font",
+            smiley,
+            "--font",
+            smiley,
+        ],
+        capture_output=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.decode().splitlines()[-1] == (
+        "0 added, 0 removed, 0 remapped, 0 changed"
+    )
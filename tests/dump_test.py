@@ -0,0 +1,266 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import csv
+from emojicompat.dump import *
+from emojicompat.emojicompat import _dump
+from emojicompat.flatbuffer import FlatbufferList, FlatbufferListView
+import io
+import json
+import pytest
+import subprocess
+import sys
+from testdata_helper import read_2_028_raw, testdata_dir
+
+
+def _sample() -> FlatbufferListView:
+    return FlatbufferListView.fromflatbytes(read_2_028_raw())
+
+
+def _expected_rows(flat_list, dump_filter: DumpFilter):
+    rows = []
+    for item in flat_list.items:
+        if dump_filter.identifier is not None and not (
+            (
+                dump_filter.identifier.start is None
+                or dump_filter.identifier.start <= item.identifier
+            )
+            and (
+                dump_filter.identifier.end is None
+                or item.identifier <= dump_filter.identifier.end
+            )
+        ):
+            continue
+        if (
+            dump_filter.codepoint is not None
+            and dump_filter.codepoint not in item.codepoints
+        ):
+            continue
+        if dump_filter.sdk_added is not None and not (
+            dump_filter.sdk_added.start <= item.sdk_added <= dump_filter.sdk_added.end
+        ):
+            continue
+        if dump_filter.compat_added is not None and not (
+            dump_filter.compat_added.start
+            <= item.compat_added
+            <= dump_filter.compat_added.end
+        ):
+            continue
+        if (
+            dump_filter.emoji_style is not None
+            and dump_filter.emoji_style != item.emoji_style
+        ):
+            continue
+        rows.append(item)
+    return rows
+
+
+@pytest.mark.parametrize(
+    "dump_filter",
+    [
+        DumpFilter(),
+        DumpFilter(identifier=IntRange(0xF0010, 0xF0040)),
+        DumpFilter(identifier=IntRange(None, 0xF0004)),
+        DumpFilter(codepoint=0x1F3FB),
+        DumpFilter(codepoint=0x10FFFF),
+        DumpFilter(sdk_added=IntRange(23, 23), emoji_style=True),
+        DumpFilter(compat_added=IntRange(1, 2), codepoint=0x200D),
+        DumpFilter(emoji_style=False),
+    ],
+)
+def test_select(dump_filter):
+    flat_list = _sample()
+    index = DumpIndex(flat_list.tocolumns())
+    selected = [flat_list.items[i] for i in index.select(dump_filter)]
+
+    assert selected == _expected_rows(flat_list, dump_filter)
+
+
+def test_int_range_fromstring():
+    assert IntRange.fromstring("23-") == IntRange(23, None)
+    assert IntRange.fromstring("-7") == IntRange(None, 7)
+    assert IntRange.fromstring("5") == IntRange(5, 5)
+    with pytest.raises(ValueError):
+        IntRange.fromstring("five")
+
+
+def test_parse_codepoint_range():
+    assert parse_codepoint_range("F0000-F00FF") == IntRange(0xF0000, 0xF00FF)
+    assert parse_codepoint_range("U+f0000-") == IntRange(0xF0000, None)
+    assert parse_codepoint_range("-0xF00FF") == IntRange(None, 0xF00FF)
+    with pytest.raises(ValueError):
+        parse_codepoint_range("F0000-G")
+
+
+def test_parse_codepoint():
+    assert parse_codepoint("1F600") == 0x1F600
+    assert parse_codepoint("U+1f600") == 0x1F600
+    assert parse_codepoint("0x200D") == 0x200D
+
+
+def _old_dump_text(flat_list) -> str:
+    # what _dump printed before there were formats
+    item_format = "{identifier:>10} {emoji_style:11} {sdk_added:9} {compat_added:12} {width:5} {height:6} {codepoints:>10}"
+    lines = [
+        f"version {flat_list.version}",
+        "identifier emoji_style sdk_added compat_added width height codepoints",
+    ]
+    for item in flat_list.items:
+        fields = item._asdict()
+        fields["identifier"] = f"U+{fields['identifier']:04x}"
+        fields["codepoints"] = ",".join(f"U+{c:04x}" for c in fields["codepoints"])
+        lines.append(item_format.format(**fields))
+    lines.append(f"source_sha {flat_list.source_sha}")
+    return "\n".join(lines) + "\n"
+
+
+def test_text_unchanged(capsys):
+    flat_list = _sample()
+    _dump(flat_list)
+
+    assert capsys.readouterr().out == _old_dump_text(flat_list)
+
+
+def test_text_of_materialized_list(capsys):
+    flat_list = _sample().materialize()
+    _dump(flat_list)
+
+    assert capsys.readouterr().out == _old_dump_text(flat_list)
+
+
+def test_jsonl():
+    flat_list = _sample()
+    dump_filter = DumpFilter(codepoint=0x1F3FD)
+    out = io.StringIO()
+    write_dump(
+        out,
+        flat_list.version,
+        flat_list.source_sha,
+        flat_list.tocolumns(),
+        "jsonl",
+        dump_filter,
+        "Noto.ttf",
+    )
+
+    header, *rows = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert header == {
+        "font": "Noto.ttf",
+        "version": flat_list.version,
+        "source_sha": flat_list.source_sha.decode(),
+    }
+    expected = _expected_rows(flat_list, dump_filter)
+    assert len(rows) == len(expected) > 0
+    assert rows == [
+        dict(item._asdict(), codepoints=list(item.codepoints)) for item in expected
+    ]
+
+
+def test_csv():
+    flat_list = _sample()
+    out = io.StringIO()
+    write_dump(
+        out, flat_list.version, flat_list.source_sha, flat_list.tocolumns(), "csv"
+    )
+
+    rows = list(csv.DictReader(io.StringIO(out.getvalue())))
+    assert len(rows) == len(flat_list.items)
+    for row, item in zip(rows, flat_list.items):
+        assert row["font"] == ""
+        assert int(row["version"]) == flat_list.version
+        assert row["source_sha"] == flat_list.source_sha.decode()
+        assert int(row["identifier"]) == item.identifier
+        assert bool(int(row["emoji_style"])) == item.emoji_style
+        assert int(row["sdk_added"]) == item.sdk_added
+        assert int(row["compat_added"]) == item.compat_added
+        assert int(row["width"]) == item.width
+        assert int(row["height"]) == item.height
+        assert tuple(map(int, row["codepoints"].split(" "))) == item.codepoints
+
+
+@pytest.mark.parametrize(
+    "dump_filter", [DumpFilter(), DumpFilter(identifier=IntRange(0xF0100, 0xF0110))]
+)
+def test_binary_roundtrip(dump_filter):
+    flat_list = _sample()
+    out = io.BytesIO()
+    write_dump(
+        out,
+        flat_list.version,
+        flat_list.source_sha,
+        flat_list.tocolumns(),
+        "binary",
+        dump_filter,
+    )
+
+    version, columns, source_sha = read_binary(out.getvalue())
+    assert version == flat_list.version
+    assert source_sha == flat_list.source_sha
+    assert FlatbufferList.fromcolumns(version, columns, source_sha).items == (
+        _expected_rows(flat_list, dump_filter)
+    )
+
+
+def test_binary_rejects_garbage():
+    with pytest.raises(ValueError):
+        read_binary(b"NOPE" + bytes(20))
+
+
+def _run_dump(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-m", "emojicompat.emojicompat", "--op", "dump", *args],
+        capture_output=True,
+    )
+
+
+def _font(name: str) -> str:
+    return str(testdata_dir() / name)
+
+
+def test_cli_jsonl_with_profile():
+    result = _run_dump(
+        "--dump_format=jsonl", "--profile", "--font", _font("Smiley.ttf")
+    )
+
+    header, *rows = [json.loads(l) for l in result.stdout.splitlines()]
+    assert header["font"] == _font("Smiley.ttf")
+    assert rows and all("identifier" in row for row in rows)
+    stages = [json.loads(l) for l in result.stderr.splitlines() if l.startswith(b"{")]
+    assert {"load", "dump"} <= {s["stage"] for s in stages}
+
+
+def test_cli_binary_with_profile():
+    result = _run_dump(
+        "--dump_format=binary", "--profile", "--font", _font("Smiley.ttf")
+    )
+
+    version, columns, source_sha = read_binary(result.stdout)
+    # nothing trails the columns
+    out = io.BytesIO()
+    write_dump(out, version, source_sha, columns, "binary")
+    assert out.getvalue() == result.stdout
+
+
+def test_cli_batch_csv_with_profile():
+    fonts = [_font("Smiley.ttf"), _font("Handshake.ttf")]
+    result = _run_dump(
+        "--dump_format=csv", "--profile", *(f"--font={f}" for f in fonts)
+    )
+
+    # Handshake.ttf has no Emji, so no rows
+    rows = list(csv.DictReader(io.StringIO(result.stdout.decode())))
+    assert {row["font"] for row in rows} == {fonts[0]}
+    assert all(row["identifier"].isdigit() for row in rows)
+    assert b"== " in result.stderr
+    assert b"fonts valid" in result.stderr
+    assert b'"stage": "dump"' in result.stderr
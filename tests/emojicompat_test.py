@@ -12,12 +12,32 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from emojicompat.emojicompat import _setup_pua, PuaCheckResult
+import emojicompat
+from emojicompat.emojicompat import (
+    _expand_fonts,
+    _check_source_sha,
+    _hash_of_font_without_compat_data,
+    _hash_of_tables_without_compat_data,
+    _setup_meta,
+    _setup_pua,
+    _TABLES_HASH_PREFIX,
+    _process_font,
+    _require_bitmap_header_version_2,
+    _save_font,
+    process_fonts,
+    ProcessOptions,
+    PuaCheckResult,
+)
 from emojicompat.flatbuffer import FlatbufferItem, FlatbufferList
+from emojicompat import timing
 from fontTools import ttLib
+from fontTools.ttLib.tables.DefaultTable import DefaultTable
 from testdata_helper import *
+from pathlib import Path
 from typing import Tuple
+import json
 import pytest
+import shutil
 
 
 _SMILEY_SEQ = (0x263A,)
@@ -78,6 +98,283 @@ def test_fix_pua():
     assert _setup_pua(font, compat_metadata) == PuaCheckResult(correct=2)
 
 
+def test_setup_pua_twice_after_non_pua_fix():
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    handshake, skin_tone = _HANDSHAKE_LIGHT_SEQ
+    compat_metadata = FlatbufferList(
+        version=42,
+        # a non-PUA identifier already in the cmap, remapped in place
+        items=(_compat_item(skin_tone, (handshake,)),),
+        source_sha="do_not_care",
+    )
+    assert _setup_pua(font, compat_metadata) == PuaCheckResult(fixed=1)
+
+    # now two codepoints map to the handshake, which can't be reversed
+    with pytest.raises(ValueError, match="non-unique"):
+        _setup_pua(font, compat_metadata)
+
+
+def test_ligature_component_without_codepoint():
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    for cmap_table in font["cmap"].tables:
+        cmap_table.cmap.pop(_HANDSHAKE_LIGHT_SEQ[1], None)
+    compat_metadata = FlatbufferList(
+        version=42,
+        items=(
+            _compat_item(_HANDSHAKE_LIGHT_PUA, _HANDSHAKE_LIGHT_SEQ),
+            _compat_item(_HANDSHAKE_MEDIUM_PUA, _HANDSHAKE_MEDIUM_SEQ),
+        ),
+        source_sha="do_not_care",
+    )
+    assert _setup_pua(font, compat_metadata) == PuaCheckResult(added=1, missing=1)
+
+
+def test_font_hash_keeps_emji():
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    emji = font["meta"].data["Emji"]
+    _hash_of_font_without_compat_data(font)
+    assert font["meta"].data["Emji"] == emji
+
+
+def test_tables_hash_ignores_emji():
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    with_emji = _hash_of_tables_without_compat_data(font)
+
+    assert not font.isLoaded("CBDT"), "hashing shouldn't decompile tables"
+
+    del font["meta"].data["Emji"]
+    assert _hash_of_tables_without_compat_data(font) == with_emji
+
+    # no meta at all hashes the same as a meta with nothing but Emji
+    del font["meta"]
+    assert _hash_of_tables_without_compat_data(font) == with_emji
+
+
+def test_check_tables_source_sha(tmp_path):
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    compat_metadata = FlatbufferList(
+        version=42,
+        items=(_compat_item(_HANDSHAKE_LIGHT_PUA, _HANDSHAKE_LIGHT_SEQ),),
+        source_sha="",
+    )
+    _setup_pua(font, compat_metadata)
+    compat_metadata = compat_metadata._replace(
+        source_sha=_TABLES_HASH_PREFIX + _hash_of_tables_without_compat_data(font)
+    )
+    _setup_meta(font, compat_metadata)
+    font.save(tmp_path / "Handshake.ttf")
+
+    font = ttLib.TTFont(tmp_path / "Handshake.ttf")
+    assert _check_source_sha(font, FlatbufferList.fromfont(font))
+
+    font["name"].setName("Changed", 1, 3, 1, 0x409)
+    font.save(tmp_path / "Changed.ttf")
+    font = ttLib.TTFont(tmp_path / "Changed.ttf")
+    assert not _check_source_sha(font, FlatbufferList.fromfont(font))
+
+
+@pytest.mark.parametrize("jobs", [1, 2])
+def test_process_fonts(tmp_path, jobs):
+    font_paths = []
+    for name in ("Smiley.ttf", "Handshake.ttf"):
+        shutil.copy(testdata_dir() / name, tmp_path / name)
+        font_paths.append(tmp_path / name)
+
+    results = process_fonts(font_paths, "setup_pua", jobs=jobs)
+
+    assert [r.font for r in results] == font_paths
+    assert [r.pua for r in results] == [
+        PuaCheckResult(added=1, missing=3578),
+        PuaCheckResult(),
+    ]
+    assert "Updating" in results[0].output
+
+
+def test_stage_timings(tmp_path):
+    shutil.copy(testdata_dir() / "Smiley.ttf", tmp_path / "Smiley.ttf")
+    timings = []
+    timing.add_stage_hook(timings.append)
+    try:
+        _process_font(tmp_path / "Smiley.ttf", "setup")
+    finally:
+        timing.remove_stage_hook(timings.append)
+
+    assert [t.stage for t in timings] == [
+        "load",
+        "compat_metadata",
+        "source_sha",
+        "setup_meta",
+        "setup_pua",
+        "bitmap_header",
+        "bitmap_size",
+        "bitmap_metrics",
+        "save",
+    ]
+    assert {t.font for t in timings} == {str(tmp_path / "Smiley.ttf")}
+    assert all(t.wall_seconds >= 0 and t.cpu_seconds >= 0 for t in timings)
+    assert all(t.peak_memory_bytes is None for t in timings)
+
+
+def test_process_fonts_profile(tmp_path):
+    shutil.copy(testdata_dir() / "Handshake.ttf", tmp_path / "Handshake.ttf")
+
+    (result,) = process_fonts(
+        [tmp_path / "Handshake.ttf"], "check", ProcessOptions(profile=True)
+    )
+
+    stages = [json.loads(l) for l in result.stages.splitlines()]
+    assert [s["stage"] for s in stages][0] == "load"
+    assert "{" not in result.output
+    assert all(s["peak_memory_bytes"] > 0 for s in stages)
+
+
+def _font_with_bitmap_version_3(tmp_path) -> Path:
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    # no strikes, just the headers
+    for tag, data in (("CBDT", b"\x00\x03\x00\x00"), ("CBLC", b"\x00\x03" + bytes(6))):
+        font[tag] = DefaultTable(tag)
+        font[tag].data = data
+    font_path = tmp_path / "Bitmap.ttf"
+    font.save(font_path)
+    return font_path
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+def test_bitmap_header_version(tmp_path, capsys, lazy):
+    font_path = _font_with_bitmap_version_3(tmp_path)
+
+    _process_font(font_path, "check", ProcessOptions(lazy=lazy))
+    assert "CBDT is at version 3.0" in capsys.readouterr().out
+
+    _process_font(font_path, "setup_pua", ProcessOptions(lazy=lazy))
+    assert "fixing that for you" in capsys.readouterr().out
+
+    _process_font(font_path, "check", ProcessOptions(lazy=lazy))
+    assert "is at version" not in capsys.readouterr().out
+    font = ttLib.TTFont(font_path)
+    assert font["CBDT"].version == 2
+    assert font["CBLC"].version == 2
+
+
+@pytest.mark.parametrize("lazy", [False, True])
+@pytest.mark.parametrize("patch", [False, True])
+def test_bitmap_header_version_keeps_tables(tmp_path, lazy, patch):
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    font["CBDT"].version = font["CBLC"].version = 3
+    font_path = tmp_path / "Smiley.ttf"
+    font.save(font_path)
+    image_data = font["CBDT"].strikeData[0]["smileface"].imageData
+    font = ttLib.TTFont(font_path, lazy=True if lazy else None)
+
+    _require_bitmap_header_version_2(font, True)
+    assert not font.isLoaded("CBDT")
+    # moves every table after it in the file that is saved over the source
+    font["AAAA"] = DefaultTable("AAAA")
+    font["AAAA"].data = bytes(4096)
+    _save_font(font, font_path, patch)
+    # still the real tables, read from the font as it was loaded
+    bitmap = font["CBDT"].strikeData[0]["smileface"]
+    bitmap.decompile()
+    assert bitmap.imageData == image_data
+    font.close()
+
+    font = ttLib.TTFont(font_path)
+    assert font["CBDT"].version == 2
+    assert font["CBLC"].version == 2
+    assert font["AAAA"].data == bytes(4096)
+    assert font["CBDT"].strikeData[0]["smileface"].imageData == image_data
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        ProcessOptions("tables", lazy=True),
+        ProcessOptions("tables", patch=True),
+        ProcessOptions("tables", lazy=True, patch=True),
+    ],
+)
+def test_setup_options_match(tmp_path, options):
+    shutil.copy(testdata_dir() / "Smiley.ttf", tmp_path / "Eager.ttf")
+    shutil.copy(testdata_dir() / "Smiley.ttf", tmp_path / "Smiley.ttf")
+    _process_font(tmp_path / "Eager.ttf", "setup", ProcessOptions("tables"))
+    _process_font(tmp_path / "Smiley.ttf", "setup", options)
+
+    eager = ttLib.TTFont(tmp_path / "Eager.ttf")
+    font = ttLib.TTFont(tmp_path / "Smiley.ttf")
+    assert sorted(eager.keys()) == sorted(font.keys())
+    for tag in ("cmap", "meta", "GSUB", "CBDT"):
+        assert eager.getTableData(tag) == font.getTableData(tag), tag
+    assert _check_source_sha(font, FlatbufferList.fromfont(font))
+
+
+def test_incremental_setup(tmp_path, capsys):
+    font_path = tmp_path / "Smiley.ttf"
+    shutil.copy(testdata_dir() / "Smiley.ttf", font_path)
+    options = ProcessOptions("tables", incremental=True)
+
+    assert _process_font(font_path, "setup", options).pua is not None
+    saved = font_path.read_bytes()
+    capsys.readouterr()
+
+    assert _process_font(font_path, "setup", options).pua is None
+    assert "nothing to do" in capsys.readouterr().out
+    assert font_path.read_bytes() == saved
+
+    # the fingerprint is per op
+    assert _process_font(font_path, "setup_pua", options).pua is not None
+
+    font = ttLib.TTFont(font_path)
+    font["name"].setName("Changed", 1, 3, 1, 0x409)
+    font.save(font_path)
+    assert _process_font(font_path, "setup_pua", options).pua is not None
+
+
+def test_incremental_setup_after_upgrade(tmp_path, monkeypatch):
+    font_path = tmp_path / "Smiley.ttf"
+    shutil.copy(testdata_dir() / "Smiley.ttf", font_path)
+    options = ProcessOptions("tables", incremental=True)
+    _process_font(font_path, "setup", options)
+
+    monkeypatch.setattr(emojicompat, "__version__", "99.0")
+    assert _process_font(font_path, "setup", options).pua is not None
+    monkeypatch.setattr(
+        emojicompat.emojicompat, "emoji_compat_metadata_sha1", lambda: "0" * 40
+    )
+    assert _process_font(font_path, "setup", options).pua is not None
+    assert _process_font(font_path, "setup", options).pua is None
+
+
+def test_expand_fonts_skips_fingerprints(tmp_path):
+    font_path = tmp_path / "Smiley.ttf"
+    shutil.copy(testdata_dir() / "Smiley.ttf", font_path)
+    _process_font(font_path, "setup", ProcessOptions(incremental=True))
+    assert (tmp_path / "Smiley.ttf.emojicompat.json").is_file()
+
+    assert _expand_fonts([str(tmp_path / "*")]) == [font_path]
+
+
+def test_expand_fonts_dedup():
+    smiley, handshake = (
+        str(testdata_dir() / f) for f in ("Smiley.ttf", "Handshake.ttf")
+    )
+
+    assert _expand_fonts([smiley, handshake, smiley]) == [
+        Path(smiley),
+        Path(handshake),
+    ]
+    assert _expand_fonts([smiley, smiley], unique=False) == [Path(smiley)] * 2
+
+
+def test_setup_twice_keeps_meta(tmp_path, capsys):
+    font_path = tmp_path / "Smiley.ttf"
+    shutil.copy(testdata_dir() / "Smiley.ttf", font_path)
+
+    _process_font(font_path, "setup", ProcessOptions("tables"))
+    assert "Updating 'meta'" in capsys.readouterr().out
+    _process_font(font_path, "setup", ProcessOptions("tables"))
+    assert "'meta' is already correct" in capsys.readouterr().out
+
+
 def _compat_item(pua: int, codepoints: Tuple[int, ...]) -> FlatbufferItem:
     return FlatbufferItem(
         identifier=pua,
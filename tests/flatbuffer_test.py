@@ -76,6 +76,142 @@ def test_from_compat_entries():
     assert sample == from_compat
 
 
+def test_from_compat_columns():
+    entries = emoji_compat_metadata()
+    from_entries = FlatbufferList.from_compat_entries(entries, "sha")
+    from_columns = FlatbufferList.from_compat_columns(
+        emoji_compat_metadata_columns(), "sha"
+    )
+
+    assert from_columns == from_entries
+    assert from_columns.items[-1] == from_entries.items[-1]
+    assert from_columns.toflatbytes() == from_entries.toflatbytes()
+    assert from_columns.tocolumns() == from_entries.tocolumns()
+
+    # changing what tocolumns returns doesn't change the list
+    from_columns.tocolumns().identifier[-1] = 0
+    assert from_columns.items[-1] == from_entries.items[-1]
+
+
+def test_fromflatbytes_columnar():
+    flat = read_2_028_raw()
+    eager = FlatbufferList.fromflatbytes(flat)
+    columnar = FlatbufferList.fromflatbytes(flat, columnar=True)
+
+    assert columnar == eager
+    assert columnar.toflatbytes() == eager.toflatbytes()
+    assert columnar.tocolumns() == CompatColumns.from_rows(eager.items)
+
+
+def test_from_compat_entries_matches_per_entry():
+    entries = emoji_compat_metadata()
+    bulk = FlatbufferList.from_compat_entries(entries, "")
+
+    assert bulk.items == tuple(FlatbufferItem.from_compat_entry(e) for e in entries)
+    assert any(i.emoji_style for i in bulk.items)
+    assert not all(i.emoji_style for i in bulk.items)
+
+
+@pytest.mark.parametrize(
+    "codepoints, emoji_style",
+    [
+        ((0x263A,), True),  # forced
+        ((0x1F600,), True),
+        ((0x0041,), False),
+        ((0x1F91D, 0x1F3FB), False),
+        ((0x10FFFF,), False),
+        ((0x110000,), False),
+    ],
+)
+def test_is_emoji_style(codepoints, emoji_style):
+    from emojicompat.flatbuffer import _is_emoji_style
+
+    assert _is_emoji_style(codepoints) == emoji_style
+
+
 # NOTE: originally wanted to confirm binary identical recreation of 2.028
 # but despite getting binaries with equivalent json the bytes differ; in
 # retrospect this is fine.
+
+
+def test_view_equals_eager():
+    eager = FlatbufferList.fromflat(read_2_028_sample())
+    view = FlatbufferListView.fromflatbytes(read_2_028_raw())
+
+    assert view == eager
+    assert eager == view
+    assert not view != eager
+    assert view.materialize() == eager
+
+
+def test_view_decodes_on_demand():
+    view = FlatbufferListView.fromflatbytes(read_2_028_raw())
+    eager = FlatbufferList.fromflat(read_2_028_sample())
+
+    assert (view.version, view.source_sha) == (eager.version, eager.source_sha)
+    assert view.items.decoded_count() == 0
+
+    assert view.items[42] == eager.items[42]
+    assert view.items[-1] == eager.items[-1]
+    assert view.items.decoded_count() == 2
+
+    # a different sha must not need the items to answer
+    assert view != eager._replace(source_sha=b"nope")
+    assert view.items.decoded_count() == 2
+
+
+def test_view_fromfont_reads_raw_meta():
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    view = FlatbufferListView.fromfont(font)
+
+    assert not font.isLoaded("meta")
+    assert view == FlatbufferList.fromfont(font)
+
+
+def test_view_fromfont_without_meta():
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    assert FlatbufferListView.fromfont(font) == FlatbufferList.empty()
+
+
+@pytest.mark.parametrize(
+    "flat",
+    [
+        read_2_028_raw(),
+        bytes(FlatbufferList.fromflat(read_2_028_sample()).toflatbytes()),
+        # all-default fields are left out of the vtable entirely
+        bytes(
+            FlatbufferList(
+                version=0,
+                items=(
+                    FlatbufferItem(0, False, 0, 0, 0, 0, ()),
+                    FlatbufferItem(0xF0000, True, 0, 1, 136, 0, (0x1F600,)),
+                ),
+                source_sha="",
+            ).toflatbytes()
+        ),
+    ],
+)
+def test_bulk_decode_matches_generated(flat):
+    assert FlatbufferList.fromflatbytes(
+        flat, bulk=True
+    ) == FlatbufferList.fromflatbytes(flat)
+
+
+@pytest.mark.parametrize(
+    "flat_list",
+    [
+        FlatbufferList.fromflat(read_2_028_sample()),
+        _sample_without_0_sizes(),
+        FlatbufferList(
+            version=0,
+            items=(
+                FlatbufferItem(0, False, 0, 0, 0, 0, ()),
+                FlatbufferItem(0xF0000, True, 0, 1, 136, 0, (0x1F600,)),
+                FlatbufferItem(0xF0001, False, 1, 0, 0, 128, (0x1F600, 0x1F3FB)),
+            ),
+            source_sha="odd length sha",
+        ),
+    ],
+)
+def test_toflatbytes_matches_builder(flat_list):
+    assert flat_list.toflatbytes() == flat_list.toflatbytes(use_builder=True)
@@ -0,0 +1,71 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from testdata_helper import testdata_dir
+import subprocess
+import sys
+
+
+# Loaded on first use only, the CLI is run once per font by some callers
+_LAZY_MODULES = (
+    "nototools.unicode_data",
+    "fontTools.ttLib.tables.otTables",
+    "concurrent.futures.process",
+)
+
+# Generous, currently ~0.2s; meant to catch a heavy import sneaking back in
+_IMPORT_BUDGET_SECONDS = 1.0
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args], capture_output=True, text=True, check=True
+    )
+
+
+def _loaded_after(code: str):
+    result = _python(
+        "-c",
+        code
+        + "\nimport sys"
+        + f"\nprint(','.join(m for m in {_LAZY_MODULES!r} if m in sys.modules))",
+    )
+    return [m for m in result.stdout.splitlines()[-1].split(",") if m]
+
+
+def test_import_is_lazy():
+    assert _loaded_after("import emojicompat.emojicompat") == []
+
+
+def test_dump_is_lazy():
+    font = testdata_dir() / "Smiley.ttf"
+    assert (
+        _loaded_after(
+            "from emojicompat.emojicompat import _process_font\n"
+            "from pathlib import Path\n"
+            f"_process_font(Path({str(font)!r}), 'dump')"
+        )
+        == []
+    )
+
+
+def test_import_time_budget():
+    # -X importtime writes "import time: self [us] | cumulative | module"
+    result = _python("-X", "importtime", "-c", "import emojicompat.emojicompat")
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit():
+            cumulative_us[module.strip()] = int(cumulative)
+    assert cumulative_us["emojicompat.emojicompat"] / 1e6 < _IMPORT_BUDGET_SECONDS
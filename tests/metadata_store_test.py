@@ -0,0 +1,151 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.compat_metadata import *
+from emojicompat.metadata_store import *
+import os
+import pytest
+
+
+def _store() -> MetadataStore:
+    return MetadataStore(
+        [
+            CompatEntry(0xF0002, 19, 1, (0x1F600,)),
+            CompatEntry(0xF0001, 19, 1, (0x1F1EA,)),
+            CompatEntry(0xF0003, 20, 2, (0x1F468, 0x200D, 0x1F469)),
+        ]
+    )
+
+
+def test_load_roundtrips_the_file():
+    store = MetadataStore.load()
+
+    assert tuple(store) == emoji_compat_metadata()
+    assert store.totext() == emoji_metadata_file().read_text()
+
+
+def test_canonical_order():
+    store = _store()
+
+    assert [e.identifier for e in store] == [0xF0001, 0xF0002, 0xF0003]
+    assert store.totext().splitlines() == [
+        "#id sdkAdded compatAdded codepoints",
+        "F0001 19 1 1F1EA",
+        "F0002 19 1 1F600",
+        "F0003 20 2 1F468 200D 1F469",
+    ]
+
+
+def test_indexes():
+    store = _store()
+
+    assert 0xF0002 in store
+    assert store.get(0xF0002).codepoints == (0x1F600,)
+    assert store.find((0x1F468, 0x200D, 0x1F469)).identifier == 0xF0003
+    assert store.find((0x1F469,)) is None
+
+
+@pytest.mark.parametrize(
+    "entry",
+    [
+        CompatEntry(0xF0002, 21, 3, (0x1F601,)),
+        CompatEntry(0xF0004, 21, 3, (0x1F600,)),
+    ],
+)
+def test_duplicates_rejected(entry):
+    store = _store()
+    before = store.totext()
+
+    with pytest.raises(ValueError):
+        store.insert(entry)
+    with pytest.raises(ValueError):
+        MetadataStore(list(_store()) + [entry])
+    assert store.totext() == before
+
+
+def test_update_and_delete():
+    store = _store()
+    store.update(CompatEntry(0xF0002, 21, 3, (0x1F601,)))
+    removed = store.delete(0xF0001)
+
+    assert removed.codepoints == (0x1F1EA,)
+    assert store.find((0x1F600,)) is None
+    assert store.find((0x1F601,)).sdk_added == 21
+    assert len(store) == 2
+    with pytest.raises(ValueError):
+        store.update(CompatEntry(0xF0009, 21, 3, (0x1F602,)))
+    with pytest.raises(ValueError):
+        store.delete(0xF0009)
+    # may not take another entry's codepoints
+    with pytest.raises(ValueError):
+        store.update(CompatEntry(0xF0002, 21, 3, (0x1F468, 0x200D, 0x1F469)))
+
+
+def test_apply_is_all_or_nothing():
+    store = _store()
+    before = store.totext()
+
+    with pytest.raises(ValueError):
+        store.apply(
+            inserts=[
+                CompatEntry(0xF0004, 21, 3, (0x1F602,)),
+                CompatEntry(0xF0005, 21, 3, (0x1F1EA,)),
+            ],
+            updates=[CompatEntry(0xF0003, 21, 3, (0x1F603,))],
+            deletes=[0xF0002],
+        )
+    assert store.totext() == before
+
+    store.apply(
+        inserts=[CompatEntry(0xF0002, 21, 3, (0x1F602,))],
+        deletes=[0xF0002],
+    )
+    assert store.get(0xF0002).codepoints == (0x1F602,)
+
+
+def test_transaction_rolls_back():
+    store = _store()
+    before = store.totext()
+
+    with pytest.raises(RuntimeError):
+        with store.transaction():
+            store.insert(CompatEntry(0xF0004, 21, 3, (0x1F602,)))
+            with store.transaction():
+                store.delete(0xF0001)
+            raise RuntimeError("changed my mind")
+    assert store.totext() == before
+
+
+def test_save(tmp_path):
+    text_file = tmp_path / "emoji_metadata.txt"
+    sidecar_file = tmp_path / "emoji_metadata.bin"
+    text_file.write_text("stale")
+    os.chmod(text_file, 0o644)
+
+    store = _store()
+    store.insert(CompatEntry(0xF0004, 21, 3, (0x1F602,)))
+    store.save(text_file, sidecar_file)
+
+    assert text_file.read_text() == store.totext()
+    assert os.stat(text_file).st_mode & 0o777 == 0o644
+    # the sidecar is current and holds what the text does
+    assert load_emoji_metadata(text_file, sidecar_file) == tuple(store)
+    compiled = tmp_path / "compiled.bin"
+    compile_emoji_metadata(text_file, compiled)
+    assert compiled.read_bytes() == sidecar_file.read_bytes()
+    assert sorted(p.name for p in tmp_path.iterdir()) == [
+        "compiled.bin",
+        "emoji_metadata.bin",
+        "emoji_metadata.txt",
+    ]
@@ -0,0 +1,95 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.compat_metadata import emoji_compat_metadata
+from emojicompat.pua import *
+import itertools
+import pytest
+
+
+def _linear_next_pua(max_pua: int) -> int:
+    # the linear scan update_emoji_metadata.py used, less its off by one
+    pua_gen = itertools.chain(*(range(s, e + 1) for s, e in PUA_RANGES))
+    return next(pua for pua in pua_gen if pua > max_pua)
+
+
+@pytest.mark.parametrize("max_pua", [0xE000, 0xF8FE, 0xF8FF, 0xF0FCF, 0xFFFFD])
+def test_matches_linear_scan(max_pua):
+    allocator = PuaAllocator([max_pua])
+    assert allocator.allocate() == _linear_next_pua(max_pua)
+
+
+def test_from_compat_metadata():
+    entries = emoji_compat_metadata()
+    max_pua = max(e.identifier for e in entries)
+    allocator = PuaAllocator.from_compat_metadata(entries)
+
+    allocated = allocator.allocate_many(10)
+    assert allocated == list(range(max_pua + 1, max_pua + 11))
+    assert not any(e.identifier in allocator for e in entries)
+
+
+def test_reuse_gaps():
+    allocator = PuaAllocator([0xF0001, 0xF0002, 0xF0005], [(0xE000, 0xF8FF)], True)
+
+    assert allocator.allocate_many(4) == [0xF0000, 0xF0003, 0xF0004, 0xF0006]
+
+
+def test_reserved():
+    allocator = PuaAllocator([0xF0000], [(0xF0002, 0xF0003), (0xF0005, 0xF0005)])
+
+    assert 0xF0002 not in allocator
+    assert 0xF0004 in allocator
+    assert allocator.allocate_many(3) == [0xF0001, 0xF0004, 0xF0006]
+
+
+def test_allocate_across_ranges():
+    allocator = PuaAllocator([0xF8FD])
+
+    assert allocator.allocate_many(4) == [0xF8FE, 0xF8FF, 0xF0000, 0xF0001]
+    assert allocator.free_ranges()[0] == (0xF0002, 0xFFFFD)
+
+
+def test_exhausted():
+    allocator = PuaAllocator([0x10FFFB])
+
+    assert allocator.allocate_many(2) == [0x10FFFC, 0x10FFFD]
+    assert allocator.free_count() == 0
+    with pytest.raises(ValueError):
+        allocator.allocate()
+
+
+def test_free_count():
+    allocator = PuaAllocator()
+    total = sum(e - s + 1 for s, e in PUA_RANGES)
+
+    assert allocator.free_count() == total
+    allocator.reserve(0xF0010, 0xF001F)
+    assert allocator.free_count() == total - 16
+    # reserving what is already taken changes nothing
+    allocator.reserve(0xF0012)
+    allocator.reserve(0x1F600, 0x1F64F)
+    assert allocator.free_count() == total - 16
+
+
+def test_parse_range():
+    assert parse_range("F0000-F00FF") == (0xF0000, 0xF00FF)
+    assert parse_range("e000") == (0xE000, 0xE000)
+
+
+def test_is_pua():
+    assert is_pua(0xE000)
+    assert is_pua(0x10FFFD)
+    assert not is_pua(0xF900)
+    assert not is_pua(0x1F600)
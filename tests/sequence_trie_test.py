@@ -0,0 +1,84 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.sequence_trie import SequenceTrie
+
+
+_HANDSHAKE = 0x1F91D
+_LIGHT = 0x1F3FB
+_MEDIUM = 0x1F3FC
+
+
+def _trie() -> SequenceTrie:
+    return SequenceTrie(
+        [
+            ((_HANDSHAKE,), "handshake"),
+            ((_HANDSHAKE, _LIGHT), "light"),
+            ((_HANDSHAKE, _MEDIUM), "medium"),
+            ((0x263A,), "smiley"),
+        ]
+    )
+
+
+def test_get_and_contains():
+    trie = _trie()
+
+    assert len(trie) == 4
+    assert trie.get((_HANDSHAKE, _LIGHT)) == "light"
+    assert (_HANDSHAKE, _MEDIUM) in trie
+    assert (_LIGHT,) not in trie
+    assert trie.get((_HANDSHAKE, _LIGHT, _LIGHT), "nope") == "nope"
+    assert list(trie.items()) == [
+        ((_HANDSHAKE,), "handshake"),
+        ((_HANDSHAKE, _LIGHT), "light"),
+        ((_HANDSHAKE, _MEDIUM), "medium"),
+        ((0x263A,), "smiley"),
+    ]
+
+
+def test_pop_keeps_children():
+    trie = _trie()
+
+    assert trie.pop((_HANDSHAKE,)) == "handshake"
+    assert trie.pop((_HANDSHAKE,)) is None
+    assert len(trie) == 3
+    assert (_HANDSHAKE,) not in trie
+    assert trie.get((_HANDSHAKE, _LIGHT)) == "light"
+    assert list(trie.values()) == ["light", "medium", "smiley"]
+
+
+def test_descend_prunes():
+    trie = _trie()
+    seen = []
+
+    def codepoints():
+        for cp in (_HANDSHAKE, 0x200D, _LIGHT):
+            seen.append(cp)
+            yield cp
+
+    assert trie.root.descend(codepoints()) is None
+    assert seen == [_HANDSHAKE, 0x200D]
+    assert trie.root.child(None) is None
+    assert trie.root.child(_HANDSHAKE).descend([_LIGHT]).value == "light"
+
+
+def test_longest_prefix():
+    trie = _trie()
+
+    assert trie.longest_prefix((_HANDSHAKE, 0x200D, _LIGHT)) == (_HANDSHAKE,)
+    assert trie.longest_prefix((_HANDSHAKE, _MEDIUM, _MEDIUM)) == (
+        _HANDSHAKE,
+        _MEDIUM,
+    )
+    assert trie.longest_prefix((0x1F600,)) == ()
@@ -0,0 +1,94 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.sfnt_patch import can_patch, save_patched
+from fontTools import ttLib
+from fontTools.ttLib.sfnt import calcChecksum
+from fontTools.ttLib.tables.DefaultTable import DefaultTable
+from testdata_helper import testdata_dir
+import io
+import pytest
+import shutil
+
+
+def _copy(tmp_path, name: str):
+    shutil.copy(testdata_dir() / name, tmp_path / name)
+    return tmp_path / name
+
+
+@pytest.mark.parametrize("lazy", [None, True])
+def test_save_patched_copies_unloaded_tables(tmp_path, lazy):
+    font_path = _copy(tmp_path, "Smiley.ttf")
+    original = ttLib.TTFont(font_path)
+
+    font = ttLib.TTFont(font_path, lazy=lazy)
+    font["cmap"].getBestCmap()[0xE000] = font.getGlyphOrder()[1]
+    font["cmap"].getcmap(3, 10).cmap[0xE000] = font.getGlyphOrder()[1]
+    save_patched(font, font_path)
+
+    patched = ttLib.TTFont(font_path, checkChecksums=2)
+    assert patched.getBestCmap()[0xE000] == font.getGlyphOrder()[1]
+    for tag in original.keys()[1:]:
+        if tag not in ("cmap", "head"):
+            assert patched.getTableData(tag) == original.getTableData(tag), tag
+    # the whole font sums to the magic number
+    assert calcChecksum(font_path.read_bytes()) == 0xB1B0AFBA
+
+
+def test_save_patched_matches_save(tmp_path):
+    font_path = _copy(tmp_path, "Handshake.ttf")
+    font = ttLib.TTFont(font_path)
+    font.recalcTimestamp = False
+    font["meta"] = ttLib.newTable("meta")
+    font["meta"].data["dlng"] = "Zsye"
+    font["name"].setName("Patched", 1, 3, 1, 0x409)
+
+    buf = io.BytesIO()
+    font.save(buf)
+    save_patched(font, font_path, tmp_path / "Patched.ttf")
+
+    saved = ttLib.TTFont(buf)
+    patched = ttLib.TTFont(tmp_path / "Patched.ttf", checkChecksums=2)
+    assert sorted(saved.keys()) == sorted(patched.keys())
+    # checkSumAdjustment depends on where tables are in the file
+    saved["head"].checkSumAdjustment = patched["head"].checkSumAdjustment = 0
+    for tag in saved.keys()[1:]:
+        assert saved.getTableData(tag) == patched.getTableData(tag), tag
+    assert calcChecksum((tmp_path / "Patched.ttf").read_bytes()) == 0xB1B0AFBA
+
+
+def test_save_patched_keeps_physical_order(tmp_path):
+    font_path = _copy(tmp_path, "Smiley.ttf")
+    font = ttLib.TTFont(font_path)
+    source_order = list(font.reader.tables)
+    font["cmap"]
+    font["Zzzz"] = DefaultTable("Zzzz")
+    font["Zzzz"].data = bytes(8)
+    save_patched(font, font_path, tmp_path / "Patched.ttf")
+
+    patched = ttLib.TTFont(tmp_path / "Patched.ttf").reader.tables
+    assert sorted(patched, key=lambda tag: patched[tag].offset) == (
+        source_order + ["Zzzz"]
+    )
+
+
+def test_cannot_patch_woff(tmp_path):
+    font = ttLib.TTFont(testdata_dir() / "Smiley.ttf")
+    font.flavor = "woff"
+    font.save(tmp_path / "Smiley.woff")
+
+    font = ttLib.TTFont(tmp_path / "Smiley.woff")
+    assert not can_patch(font)
+    with pytest.raises(ValueError):
+        save_patched(font, tmp_path / "Smiley.woff")
@@ -24,6 +24,10 @@ def testdata_dir() -> Path:
     return result
 
 
+# not a test, whatever pytest makes of its name where it's imported
+testdata_dir.__test__ = False
+
+
 def read_2_028_raw() -> bytes:
     return (testdata_dir() / "noto_emji_2_028.dat").read_bytes()
 
@@ -0,0 +1,173 @@
+# Copyright 2026 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from emojicompat.util import *
+from fontTools import ttLib
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib.tables import otTables
+import io
+import pytest
+from testdata_helper import testdata_dir
+
+
+def _ligature_font(features: str) -> ttLib.TTFont:
+    glyphs = [".notdef", "a", "b", "c", "a_b", "a_b_c", "b_c"]
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(glyphs)
+    fb.setupCharacterMap({ord(c): c for c in "abc"})
+    empty = TTGlyphPen(None).glyph()
+    fb.setupGlyf({g: empty for g in glyphs})
+    fb.setupHorizontalMetrics({g: (500, 0) for g in glyphs})
+    fb.setupHorizontalHeader()
+    fb.setupOS2()
+    fb.setupPost()
+    addOpenTypeFeaturesFromString(fb.font, features)
+
+    # round trip so GSUB looks like it does when read from a file
+    buf = io.BytesIO()
+    fb.font.save(buf)
+    buf.seek(0)
+    return ttLib.TTFont(buf)
+
+
+def test_ligatures_handshake():
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    ligas = list(ligatures(font["GSUB"].table))
+
+    assert [components for components, _ in ligas] == [
+        ("u1F91D", f"u{tone:04X}") for tone in range(0x1F3FB, 0x1F3FF + 1)
+    ]
+
+
+def test_ligatures_in_extension_lookups():
+    font = _ligature_font(
+        """
+        lookup single { sub c by b; } single;
+        lookup direct { sub a b c by a_b_c; } direct;
+        lookup wrapped useExtension { sub a b by a_b; sub b c by b_c; } wrapped;
+        lookup shadowed { sub a b by b_c; } shadowed;
+        feature liga { lookup single; lookup direct; lookup wrapped; lookup shadowed; } liga;
+        """
+    )
+    gsub = font["GSUB"].table
+
+    assert sorted(ligatures(gsub)) == [
+        (("a", "b"), "a_b"),
+        (("a", "b"), "b_c"),
+        (("a", "b", "c"), "a_b_c"),
+        (("b", "c"), "b_c"),
+    ]
+    assert ligature_index(gsub) == {
+        ("a", "b", "c"): "a_b_c",
+        ("a", "b"): "a_b",
+        ("b", "c"): "b_c",
+    }
+
+
+_MIXED_FEATURES = """
+    lookup single { sub c by b; } single;
+    lookup wrapped useExtension { sub a b by a_b; sub b c by b_c; } wrapped;
+    feature liga { lookup single; lookup wrapped; } liga;
+"""
+
+
+def test_dfs_and_bfs_visit_the_same_tables():
+    gsub = _ligature_font(_MIXED_FEATURES)["GSUB"].table
+
+    dfs = list(dfs_base_table(gsub, "GSUB"))
+    bfs = list(bfs_base_table(gsub, "GSUB"))
+
+    assert dfs[0][0].value is gsub
+    assert sorted(len(p) for p in dfs) == [len(p) for p in bfs]
+    assert {id(p[-1].value) for p in dfs} == {id(p[-1].value) for p in bfs}
+    # depth first means every path extends one seen earlier
+    for i, path in enumerate(dfs[1:], 1):
+        assert any(path[:-1] == dfs[j] for j in range(i))
+
+
+def test_nodes_track_depth_and_path():
+    gsub = _ligature_font(_MIXED_FEATURES)["GSUB"].table
+
+    for node in bfs_nodes(gsub, "GSUB"):
+        path = node.path()
+        assert len(path) == node.depth + 1
+        assert path[-1].value is node.value
+
+
+def test_iter_base_tables_filter_and_prune():
+    gsub = _ligature_font(_MIXED_FEATURES)["GSUB"].table
+
+    assert list(iter_base_tables(gsub, otTables.LigatureSubst)) == list(
+        ligature_subtables(gsub)
+    )
+
+    def skip_non_ligature_lookups(table):
+        return isinstance(table, otTables.Lookup) and table.LookupType != 7
+
+    assert not any(
+        isinstance(t, otTables.SingleSubst)
+        for t in iter_base_tables(gsub, prune=skip_non_ligature_lookups)
+    )
+    assert any(
+        isinstance(n.value, otTables.SingleSubst) for n in dfs_nodes(gsub, "GSUB")
+    )
+
+
+def _never(cp: int) -> bool:
+    return False
+
+
+def test_identical_cmaps():
+    cmap = {0x61: "a", 0x62: "b"}
+    assert identical_cmaps([cmap, cmap])
+    assert identical_cmaps([cmap, dict(cmap)])
+    assert not identical_cmaps([cmap, {0x61: "a"}])
+    assert not identical_cmaps([cmap, {0x61: "a", 0x62: "c"}])
+    assert not identical_cmaps([])
+
+
+def test_reverse_cmap():
+    cmap = {0x20: "space", 0x61: "a", 0x62: "b", 0xA0: "space"}
+
+    assert reverse_cmap(cmap, lambda cp: cp == 0x20) == {
+        "a": 0x61,
+        "b": 0x62,
+        "space": 0xA0,
+    }
+    with pytest.raises(ValueError):
+        reverse_cmap(cmap, _never)
+
+
+def _pua_or_space(cp: int) -> bool:
+    return cp <= 0x20 or 0xE000 <= cp <= 0xF8FF
+
+
+def test_cmap_index_cached():
+    font = ttLib.TTFont(testdata_dir() / "Handshake.ttf")
+    index = cmap_index(font, _pua_or_space)
+    assert cmap_index(font, _pua_or_space) is index
+    assert cmap_index(font, lambda cp: _pua_or_space(cp)) is not index
+
+    # growing the cmap invalidates
+    index = cmap_index(font, _pua_or_space)
+    index.cmaps[0][0xE000] = font.getGlyphOrder()[1]
+    assert cmap_index(font, _pua_or_space) is not index
+
+    # unless we say we only touched codepoints that are skipped
+    index = cmap_index(font, _pua_or_space)
+    index.cmaps[0][0xE001] = font.getGlyphOrder()[1]
+    keep_cmap_index(font, index)
+    assert cmap_index(font, _pua_or_space).reverse is index.reverse
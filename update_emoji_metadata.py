@@ -2,8 +2,9 @@
 
 from absl import app
 from absl import flags
-from emojicompat.compat_metadata import emoji_compat_metadata, emoji_metadata_file
-import itertools
+from emojicompat.compat_metadata import CompatEntry
+from emojicompat.metadata_store import MetadataStore
+from emojicompat.pua import PuaAllocator, parse_range
 from nototools import unicode_data
 from typing import Tuple
 
@@ -12,6 +13,8 @@ FLAGS = flags.FLAGS
 
 
 flags.DEFINE_integer("sdk_added", None, "The SDK that will have the new sequences")
+flags.DEFINE_multi_string("reserved_pua", [], "PUA, or a range like F1000-F10FF, never to use as an identifier")
+flags.DEFINE_bool("reuse_pua_gaps", False, "Fill gaps between existing identifiers rather than only going past the highest")
 
 
 _IGNORED = {
@@ -25,8 +28,8 @@ def _unqualify(seq: Tuple[int, ...]) -> Tuple[int, ...]:
 
 
 def main(_):
-    current_metadata = emoji_compat_metadata()
-    max_pua = max(c.identifier for c in current_metadata)
+    store = MetadataStore.load()
+    current_metadata = tuple(store)
     max_sdk_added = max(c.sdk_added for c in current_metadata)
     max_compat_added = max(c.compat_added for c in current_metadata)
     current_emoji = set(c.codepoints for c in current_metadata)
@@ -40,18 +43,23 @@ def main(_):
         print(" ".join(f"{c:04x}" for c in s))
 
     if new_emoji:
-        pua_gen = itertools.chain(range(0xE000, 0xF8FF + 1), range(0xF0000, 0xFFFFD + 1), range(0x100000, 0x10FFFD + 1))
-        while next(pua_gen) <= max_pua:
-            continue
-
-        with open(emoji_metadata_file(), "a") as f:
-            for seq in sorted(new_emoji):
-                pua = next(pua_gen)
-                assert pua > max_pua
-
-                seq = " ".join(f"{c:04X}" for c in seq)
-                f.write(f"{pua:04X} {FLAGS.sdk_added} {max_compat_added + 1} {seq}\n")
-
+        allocator = PuaAllocator.from_compat_metadata(
+            current_metadata,
+            reserved=[parse_range(r) for r in FLAGS.reserved_pua],
+            reuse_gaps=FLAGS.reuse_pua_gaps,
+        )
+        new_emoji = sorted(new_emoji)
+        puas = allocator.allocate_many(len(new_emoji))
+
+        # every new entry or none, checked against the rest for duplicates
+        store.apply(
+            inserts=(
+                CompatEntry(pua, FLAGS.sdk_added, max_compat_added + 1, seq)
+                for pua, seq in zip(puas, new_emoji)
+            )
+        )
+        # the text and its precompiled copy, each replaced in one go
+        store.save()
 
 
 if __name__ == "__main__":